@@ -17,7 +17,7 @@ from dotenv import load_dotenv
 import time
 from typing import Dict, Any, Optional
 
-from services.auth_service import upsert_user, create_session, verify_session
+from services.auth_service import upsert_user, create_session, verify_session, invalidate_user_sessions
 from services.db import init_sync_db
 
 # 加载环境变量
@@ -422,6 +422,7 @@ async def oauth_mock_login(payload: Dict[str, Any]):
         cur.execute("UPDATE users SET role = ? WHERE user_id = ?", (role, user_id))
         conn.commit()
         conn.close()
+        invalidate_user_sessions(user_id)
     except Exception:
         pass
 
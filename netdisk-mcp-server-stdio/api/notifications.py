@@ -18,7 +18,9 @@ from services.notify_service import (
     record_notification_event,
     resend_notification,
     delete_notification,
-    create_notification
+    bulk_delete_notifications,
+    create_notification,
+    get_notification_stats as load_notification_stats
 )
 
 router = APIRouter(prefix="/api/notifications", tags=["notifications"])
@@ -29,6 +31,7 @@ async def get_notifications(
     status: Optional[str] = Query(None, regex="^(unread|read|all)$", description="通知状态筛选"),
     limit: int = Query(20, ge=1, le=100, description="返回数量限制"),
     offset: int = Query(0, ge=0, description="偏移量"),
+    before_ts: Optional[float] = Query(None, description="游标：上一页最后一条通知的 created_at"),
     # 扩展分页/筛选（向下兼容）
     page: Optional[int] = Query(None, ge=1),
     size: Optional[int] = Query(None, ge=1, le=100),
@@ -36,12 +39,13 @@ async def get_notifications(
     since: Optional[float] = Query(None, description="起始时间戳"),
     until: Optional[float] = Query(None, description="结束时间戳"),
     channel: Optional[str] = Query(None, description="渠道，例如 inbox"),
+    metadata_kind: Optional[str] = Query(None, description="按 metadata.kind 筛选"),
 ):
     """
     获取用户通知列表（兼容旧参），如提供 page/size 将使用分页模式并返回 items/has_more。
     """
     # 如果提供了 page/size 或其他筛选，走高级查询
-    if page is not None or size is not None or type or since is not None or until is not None or channel:
+    if page is not None or size is not None or type or since is not None or until is not None or channel or metadata_kind:
         adv = get_notifications_advanced(
             user_id=user_id,
             page=page or (offset // limit + 1),
@@ -51,12 +55,13 @@ async def get_notifications(
             since=since,
             until=until,
             channel=channel,
+            metadata_kind=metadata_kind,
         )
         if adv["status"] != "success":
             raise HTTPException(status_code=400, detail=adv["message"])
         return adv
     # 否则走旧的 limit/offset 结构
-    result = get_user_notifications(user_id, limit, offset, status)
+    result = get_user_notifications(user_id, limit, offset, status, before_ts=before_ts)
     if result["status"] != "success":
         raise HTTPException(status_code=400, detail=result["message"])
     return result
@@ -176,6 +181,17 @@ async def resend(notification_id: int = Path(...)):
         raise HTTPException(status_code=400, detail=resp["message"])
     return resp
 
+@router.post("/bulk-delete")
+async def bulk_delete(payload: Dict[str, Any]):
+    """批量删除：payload 为 {"ids": [通知ID, ...]}"""
+    ids = payload.get("ids")
+    if not isinstance(ids, list) or not ids:
+        raise HTTPException(status_code=400, detail="missing ids")
+    resp = bulk_delete_notifications(ids)
+    if resp["status"] != "success":
+        raise HTTPException(status_code=400, detail=resp["message"])
+    return resp
+
 @router.delete("/{notification_id}")
 async def delete(notification_id: int = Path(...)):
     resp = delete_notification(notification_id)
@@ -187,20 +203,17 @@ async def get_notification_stats(
     user_id: str = Query(..., description="用户ID")
 ):
     """扩展统计：返回未读/总数，并按 type/channel 维度的未读计数。"""
-    unread_result = get_unread_count(user_id)
-    if unread_result["status"] != "success":
-        raise HTTPException(status_code=400, detail=unread_result["message"])
-    base_list = get_user_notifications(user_id, limit=1, offset=0)
-    if base_list["status"] != "success":
-        raise HTTPException(status_code=400, detail=base_list["message"])
+    stats = load_notification_stats(user_id)
+    if stats["status"] != "success":
+        raise HTTPException(status_code=400, detail=stats["message"])
 
     # 统计按 type/channel 的未读数
     # 直接调用高级查询分页统计成本高，这里走轻量 SQL via service 不暴露；简单起见，客户端分维度拉取可替代。
     return {
         "status": "success",
         "stats": {
-            "unread_count": unread_result["unread_count"],
-            "total_count": base_list["total"],
+            "unread_count": stats["unread_count"],
+            "total_count": stats["total_count"],
             "user_id": user_id
         }
     }
@@ -16,10 +16,12 @@ from services.payment_service import (
     bind_payment_account, 
     load_platform_payment_config, 
     save_platform_payment_config,
+    disable_platform_payment_config,
     process_payment_transaction
 )
 from services.payment_service import query_alipay_trade
 from services.order_service import process_payment_callback
+from services.auth_service import invalidate_user_sessions
 from services.db import init_sync_db
 import sqlite3
 from api.deps import get_current_user
@@ -151,6 +153,8 @@ async def api_payment_verify(payload: Dict[str, Any], user: Dict[str, Any] = Dep
         ''', (account_id, status, remark, operator_id))
         
         conn.commit()
+        if status == "verified":
+            invalidate_user_sessions(user_id)
         
         return JSONResponse({
             "status": "success",
@@ -410,26 +414,9 @@ async def api_payment_config_clear(payload: Dict[str, Any], user: Dict[str, Any]
     if not provider:
         return JSONResponse({"status": "error", "message": "missing provider"}, status_code=400)
     
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute('''
-            UPDATE platform_payment_configs 
-            SET status = 'disabled', updated_at = ?
-            WHERE provider = ?
-        ''', (time.time(), provider))
-        
-        return JSONResponse({
-            "status": "success",
-            "message": f"config for {provider} cleared"
-        })
-        
-    except Exception as e:
-        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
-    finally:
-        conn.close()
+    resp = disable_platform_payment_config(provider)
+    status_code = 200 if resp.get("status") == "success" else 500
+    return JSONResponse(resp, status_code=status_code)
 
 # 支付交易处理
 @router.post("/transaction")
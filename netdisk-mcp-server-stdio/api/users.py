@@ -11,6 +11,7 @@ from fastapi.responses import JSONResponse
 from typing import Optional
 
 from services.db import init_sync_db
+from services.auth_service import invalidate_user_sessions
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
@@ -150,6 +151,7 @@ async def api_users_update_role(user_id: str, role_data: dict):
         # 更新角色
         cursor.execute("UPDATE users SET role = ? WHERE user_id = ?", (new_role, user_id))
         conn.commit()
+        invalidate_user_sessions(user_id)
         
         return JSONResponse({
             "status": "success",
@@ -649,6 +649,12 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "mcp-server"}
 
+# 停机时写入异步队列中尚未落库的通知
+@app.on_event("shutdown")
+def flush_pending_notifications():
+    from services.notify_service import flush_notifications
+    flush_notifications()
+
 # HTML页面路由
 @app.get("/admin")
 async def admin_page():
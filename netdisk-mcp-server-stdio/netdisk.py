@@ -14,6 +14,7 @@ import io
 import time
 import random
 import threading
+import functools
 from collections import defaultdict, deque
 
 # 添加当前目录到系统路径
@@ -243,6 +244,40 @@ def configure_session():
     finally:
         session.close()
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    _json_loads = json.loads
+    _json_dumps = json.dumps
+
+@functools.lru_cache(maxsize=256)
+def _dump_fsids(fsids: tuple) -> str:
+    """序列化 fsid 列表（批量脚本常重复转存同一批文件，按 tuple 缓存结果）"""
+    return _json_dumps(list(fsids))
+
+# 分享/授权等轻量 REST 接口共用的长连接会话
+_SESSION = requests.Session()
+
+def _call_api(method: str, url: str, params: Optional[dict] = None, data: Optional[dict] = None,
+              timeout: int = TIMEOUT, check_errno: bool = True) -> tuple[Optional[dict], Optional[str]]:
+    """调用百度开放接口，返回 (data, err)。
+
+    直接对 response.content 做一次 JSON 解码（跳过 response.json() 的文本解码），
+    errno 非 0 时返回 (None, show_msg)；check_errno=False 时原样返回完整结果。
+    """
+    resp = _SESSION.request(method, url, params=params, data=data, timeout=timeout)
+    resp.raise_for_status()
+    result = _json_loads(resp.content)
+    if not check_errno:
+        return result, None
+    if result.get('errno') != 0:
+        return None, result.get('show_msg', '未知错误')
+    return result.get('data', {}), None
+
 @mcp.tool()
 def upload_file(local_file_path: str, remote_path: str = None) -> Dict[str, Any]:
     """
@@ -1714,27 +1749,10 @@ def get_share_info(share_id: int) -> Dict[str, Any]:
     - 分享详情信息
     """
     try:
-        # 构建请求URL
-        url = f"https://pan.baidu.com/apaas/1.0/share/query"
-        
-        # 构建请求参数
-        params = {
-            'product': 'netdisk',
-            'appid': app_key,
-            'access_token': access_token,
-            'share_id': str(share_id)
-        }
-        
-        # 发送请求
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        if result.get('errno') != 0:
-            return {"status": "error", "message": f"查询分享详情失败: {result.get('show_msg', '未知错误')}"}
-        
-        share_data = result.get('data', {})
+        params = {'product': 'netdisk', 'appid': app_key, 'access_token': access_token, 'share_id': str(share_id)}
+        share_data, err = _call_api('GET', "https://pan.baidu.com/apaas/1.0/share/query", params=params)
+        if err is not None:
+            return {"status": "error", "message": f"查询分享详情失败: {err}"}
         return {
             "status": "success",
             "message": "查询分享详情成功",
@@ -1771,34 +1789,11 @@ def transfer_share_files(share_id: int, pwd: str, fsids: list, dest_path: str =
     - 转存任务信息
     """
     try:
-        # 构建请求URL
-        url = f"https://pan.baidu.com/apaas/1.0/share/transfer"
-        
-        # 构建请求参数
-        params = {
-            'product': 'netdisk',
-            'appid': app_key,
-            'access_token': access_token
-        }
-        
-        # 构建请求体
-        data = {
-            'share_id': str(share_id),
-            'pwd': pwd,
-            'fsids': json.dumps(fsids),
-            'dest_path': dest_path
-        }
-        
-        # 发送请求
-        response = requests.post(url, params=params, data=data, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        if result.get('errno') != 0:
-            return {"status": "error", "message": f"转存分享文件失败: {result.get('show_msg', '未知错误')}"}
-        
-        transfer_data = result.get('data', {})
+        params = {'product': 'netdisk', 'appid': app_key, 'access_token': access_token}
+        data = {'share_id': str(share_id), 'pwd': pwd, 'fsids': _dump_fsids(tuple(fsids)), 'dest_path': dest_path}
+        transfer_data, err = _call_api('POST', "https://pan.baidu.com/apaas/1.0/share/transfer", params=params, data=data)
+        if err is not None:
+            return {"status": "error", "message": f"转存分享文件失败: {err}"}
         return {
             "status": "success",
             "message": "转存分享文件成功",
@@ -1829,29 +1824,11 @@ def get_share_download_url(share_id: int, pwd: str, fsid: int) -> Dict[str, Any]
     - 下载地址信息
     """
     try:
-        # 构建请求URL
-        url = f"https://pan.baidu.com/apaas/1.0/share/download"
-        
-        # 构建请求参数
-        params = {
-            'product': 'netdisk',
-            'appid': app_key,
-            'access_token': access_token,
-            'share_id': str(share_id),
-            'pwd': pwd,
-            'fsid': str(fsid)
-        }
-        
-        # 发送请求
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        if result.get('errno') != 0:
-            return {"status": "error", "message": f"获取分享下载地址失败: {result.get('show_msg', '未知错误')}"}
-        
-        download_data = result.get('data', {})
+        params = {'product': 'netdisk', 'appid': app_key, 'access_token': access_token,
+                  'share_id': str(share_id), 'pwd': pwd, 'fsid': str(fsid)}
+        download_data, err = _call_api('GET', "https://pan.baidu.com/apaas/1.0/share/download", params=params)
+        if err is not None:
+            return {"status": "error", "message": f"获取分享下载地址失败: {err}"}
         return {
             "status": "success",
             "message": "获取分享下载地址成功",
@@ -1927,18 +1904,14 @@ def refresh_access_token() -> Dict[str, Any]:
                 }
             }
         
-        # 构建刷新token的请求
-        url = "https://openapi.baidu.com/oauth/2.0/token"
+        # OAuth 接口无 errno 字段，错误以 error/error_description 返回
         data = {
             'grant_type': 'refresh_token',
             'refresh_token': refresh_token,
             'client_id': app_key,
             'client_secret': secret_key
         }
-        
-        response = requests.post(url, data=data, timeout=30)
-        response.raise_for_status()
-        result = response.json()
+        result, _ = _call_api('POST', "https://openapi.baidu.com/oauth/2.0/token", data=data, check_errno=False)
         
         if 'error' in result:
             return {
@@ -5,6 +5,7 @@ import argparse
 import csv
 import json
 import os
+import pathlib
 import sqlite3
 import sys
 import time
@@ -30,9 +31,17 @@ def parse_time_arg(val: str) -> float:
 
 
 def load_db():
+    # 只读 + 自动提交：对账扫描不持有隐式事务，不阻塞并发的财务写入
+    # （WAL 已由 init_sync_db 在建库时开启，只读连接无需也无法切换 journal_mode）
     from services.db import init_sync_db
     path = init_sync_db()
-    return sqlite3.connect(path)
+    # 路径经 as_uri() 百分号编码：安装目录含 #、?、% 或 Windows 盘符时 URI 仍指向同一文件
+    uri = pathlib.Path(path).resolve().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA mmap_size=268435456')
+    conn.execute('PRAGMA cache_size=-65536')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
 
 
 def reconcile(start_ts: float, end_ts: float) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
@@ -6,10 +6,65 @@
 """
 
 import sqlite3
-import secrets
+import threading
 import time
-from typing import Dict, Any, Optional
-from .db import init_sync_db
+from base64 import urlsafe_b64encode
+from collections import OrderedDict
+from os import urandom
+from typing import Dict, Any, Iterable, Optional, Tuple
+from .db import get_db_connection
+from . import writer
+
+# 认证热路径 SQL：模块级常量，保证同一连接上命中 sqlite3 语句缓存
+_SQL_UPSERT_USER = '''
+INSERT INTO users (user_id, display_name, avatar_url, role, registered_at, last_login_at)
+VALUES (?, ?, ?, 'basic', ?, ?)
+ON CONFLICT(user_id) DO UPDATE SET
+    display_name = COALESCE(excluded.display_name, users.display_name),
+    avatar_url = COALESCE(excluded.avatar_url, users.avatar_url),
+    last_login_at = excluded.last_login_at
+RETURNING registered_at
+'''
+
+_SQL_INSERT_SESSION = '''
+INSERT OR IGNORE INTO sessions (session_id, user_id, created_at, expires_at,
+                      user_agent, ip_address)
+VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+_SQL_VERIFY_SESSION = '''
+SELECT s.user_id, CAST(s.expires_at AS INTEGER) AS expires_at, u.display_name, u.avatar_url, u.role,
+       CAST(u.registered_at AS INTEGER) AS registered_at, CAST(u.last_login_at AS INTEGER) AS last_login_at
+FROM sessions s
+JOIN users u USING (user_id)
+WHERE s.session_id = ?1 AND (s.expires_at IS NULL OR s.expires_at >= ?2)
+'''
+
+# 已验证会话的进程内 LRU 缓存：session_id -> (缓存过期时间, 用户信息)
+SESSION_CACHE_TTL = 30
+SESSION_CACHE_SIZE = 10000
+_SESSION_CACHE: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_SESSION_CACHE_LOCK = threading.Lock()
+
+# 无效/过期 session_id 的负缓存：session_id -> 缓存过期时间（与 _SESSION_CACHE 共用锁）
+BAD_SESSION_TTL = 60
+BAD_SESSION_CACHE_SIZE = 100000
+_BAD_SIDS: "OrderedDict[str, float]" = OrderedDict()
+
+# 用户展示名的进程内 LRU 缓存：user_id -> (缓存过期时间, display_name)
+# 订单列表/详情按 user_id 解析买卖双方名称，不再逐行 JOIN users；upsert_user 更新名称时失效
+DISPLAY_NAME_CACHE_TTL = 300
+DISPLAY_NAME_CACHE_SIZE = 4096
+_DISPLAY_NAMES: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+_DISPLAY_NAMES_LOCK = threading.Lock()
+
+def _new_sid() -> str:
+    """生成会话 ID（与 secrets.token_urlsafe(32) 输出格式相同）"""
+    return urlsafe_b64encode(urandom(32)).rstrip(b'=').decode('ascii')
+
+def _now_s() -> int:
+    """当前时间（整数秒）；users/sessions 的时间戳统一按 INTEGER 存储"""
+    return int(time.time())
 
 def upsert_user(user_id: str, display_name: Optional[str] = None,
                 avatar_url: Optional[str] = None) -> Dict[str, Any]:
@@ -19,40 +74,23 @@ def upsert_user(user_id: str, display_name: Optional[str] = None,
     if not user_id:
         return {"status": "error", "message": "missing user_id"}
 
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    now = time.time()
+    now = _now_s()
 
     try:
-        cursor.execute('SELECT user_id FROM users WHERE user_id = ?', (user_id,))
-        exists = cursor.fetchone() is not None
-
-        if exists:
-            cursor.execute('''
-                UPDATE users
-                SET display_name = COALESCE(?, display_name),
-                    avatar_url = COALESCE(?, avatar_url),
-                    last_login_at = ?
-                WHERE user_id = ?
-            ''', (display_name, avatar_url, now, user_id))
-            message = "user updated"
-        else:
-            cursor.execute('''
-                INSERT INTO users (user_id, display_name, avatar_url, role, registered_at, last_login_at)
-                VALUES (?, ?, ?, 'basic', ?, ?)
-            ''', (user_id, display_name, avatar_url, now, now))
-            message = "user created"
-
-        conn.commit()
+        # 单条 UPSERT：冲突时只更新非空字段；UPSERT 的 changes() 在两种情况下都是 1，
+        # 因此用 RETURNING 的 registered_at 是否等于本次时间戳区分新建/更新
+        # （时间戳为整数秒，注册当秒内的再次登录也会报告为 created，仅影响提示文案）
+        result = writer.submit(_SQL_UPSERT_USER, (user_id, display_name, avatar_url, now, now)).result(timeout=writer.RESULT_TIMEOUT)
+        if display_name is not None:
+            with _DISPLAY_NAMES_LOCK:
+                _DISPLAY_NAMES.pop(user_id, None)
+        created = bool(result.rows) and result.rows[0][0] == now
+        message = "user created" if created else "user updated"
+
         return {"status": "success", "message": message}
 
     except Exception as exc:
-        conn.rollback()
         return {"status": "error", "message": str(exc)}
-    finally:
-        conn.close()
 
 def create_session(user_id: str, ttl_seconds: int = 7 * 24 * 3600,
                    user_agent: Optional[str] = None,
@@ -63,31 +101,21 @@ def create_session(user_id: str, ttl_seconds: int = 7 * 24 * 3600,
     if not user_id:
         return {"status": "error", "message": "missing user_id"}
 
-    session_id = secrets.token_urlsafe(32)
-    now = time.time()
+    session_id = _new_sid()
+    now = _now_s()
     expires_at = now + ttl_seconds
 
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
     try:
-        cursor.execute('''
-            INSERT INTO sessions (session_id, user_id, created_at, expires_at,
-                                  user_agent, ip_address)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (session_id, user_id, now, expires_at, user_agent, ip_address))
-        conn.commit()
+        result = writer.submit(_SQL_INSERT_SESSION, (session_id, user_id, now, expires_at, user_agent, ip_address)).result(timeout=writer.RESULT_TIMEOUT)
+        if result.rowcount == 0:
+            return {"status": "error", "message": "session_id collision, retry"}
         return {
             "status": "success",
             "session_id": session_id,
             "expires_at": expires_at
         }
     except Exception as exc:
-        conn.rollback()
         return {"status": "error", "message": str(exc)}
-    finally:
-        conn.close()
 
 def verify_session(session_id: str) -> Optional[Dict[str, Any]]:
     """
@@ -95,39 +123,90 @@ def verify_session(session_id: str) -> Optional[Dict[str, Any]]:
     """
     if not session_id:
         return None
-    
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+
+    now = _now_s()
+    with _SESSION_CACHE_LOCK:
+        cached = _SESSION_CACHE.get(session_id)
+        if cached is not None:
+            cache_expires_at, user_info = cached
+            session_expires_at = user_info["expires_at"]
+            if cache_expires_at > now and (not session_expires_at or session_expires_at >= now):
+                _SESSION_CACHE.move_to_end(session_id)
+                return dict(user_info)
+            del _SESSION_CACHE[session_id]
+        bad_until = _BAD_SIDS.get(session_id)
+        if bad_until is not None:
+            if bad_until > now:
+                return None
+            del _BAD_SIDS[session_id]
     
     try:
-        cursor.execute('''
-            SELECT s.user_id, s.expires_at, u.display_name, u.avatar_url, u.role, u.registered_at, u.last_login_at
-            FROM sessions s
-            JOIN users u ON s.user_id = u.user_id
-            WHERE s.session_id = ?
-        ''', (session_id,))
-        
-        row = cursor.fetchone() 
+        # 过期判断下推到 SQL：过期会话在 JOIN 之前即被过滤
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            # row_factory 只设在游标上，池化连接被其他模块复用时仍返回元组
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(_SQL_VERIFY_SESSION, (session_id, now))
+            row = cursor.fetchone()
         if not row:
+            with _SESSION_CACHE_LOCK:
+                _BAD_SIDS[session_id] = now + BAD_SESSION_TTL
+                while len(_BAD_SIDS) > BAD_SESSION_CACHE_SIZE:
+                    _BAD_SIDS.popitem(last=False)
             return None
-        
-        user_id, expires_at, display_name, avatar_url, role, registered_at, last_login_at = row
-        
-        if expires_at and expires_at < time.time():
-            return None
-            
-        return {
-            "user_id": user_id,
-            "expires_at": expires_at,
-            "display_name": display_name,
-            "avatar_url": avatar_url,
-            "role": role,
-            "registered_at": registered_at,
-            "last_login_at": last_login_at
-        }
+
+        user_info = dict(row)
+        with _SESSION_CACHE_LOCK:
+            _SESSION_CACHE[session_id] = (now + SESSION_CACHE_TTL, user_info)
+            _SESSION_CACHE.move_to_end(session_id)
+            while len(_SESSION_CACHE) > SESSION_CACHE_SIZE:
+                _SESSION_CACHE.popitem(last=False)
+        return dict(user_info)
         
     except Exception:
         return None
-    finally:
-        conn.close()
+
+def invalidate_user_sessions(user_id: str) -> None:
+    """
+    使某用户的全部会话缓存失效（角色等用户信息变更后调用，避免缓存中的旧 role 继续生效）
+    """
+    with _SESSION_CACHE_LOCK:
+        stale = [sid for sid, (_, info) in _SESSION_CACHE.items() if info.get("user_id") == user_id]
+        for sid in stale:
+            del _SESSION_CACHE[sid]
+
+def get_display_names(user_ids: Iterable[Optional[str]],
+                      cursor: Optional[sqlite3.Cursor] = None) -> Dict[str, Optional[str]]:
+    """
+    批量解析用户展示名（先查缓存，未命中的一次 IN 查询补齐）
+    传入 cursor 时在调用方的连接上查询，否则借用一个池化连接
+    """
+    now = _now_s()
+    names: Dict[str, Optional[str]] = {}
+    missing = []
+    with _DISPLAY_NAMES_LOCK:
+        for uid in dict.fromkeys(u for u in user_ids if u):
+            cached = _DISPLAY_NAMES.get(uid)
+            if cached is not None and cached[0] > now:
+                _DISPLAY_NAMES.move_to_end(uid)
+                names[uid] = cached[1]
+            else:
+                missing.append(uid)
+    if not missing:
+        return names
+
+    sql = f"SELECT user_id, display_name FROM users WHERE user_id IN ({','.join('?' * len(missing))})"
+    if cursor is not None:
+        rows = cursor.execute(sql, missing).fetchall()
+    else:
+        with get_db_connection() as conn:
+            rows = conn.execute(sql, missing).fetchall()
+    found = dict(rows)
+    with _DISPLAY_NAMES_LOCK:
+        for uid in missing:
+            names[uid] = found.get(uid)
+            _DISPLAY_NAMES[uid] = (now + DISPLAY_NAME_CACHE_TTL, names[uid])
+            _DISPLAY_NAMES.move_to_end(uid)
+        while len(_DISPLAY_NAMES) > DISPLAY_NAME_CACHE_SIZE:
+            _DISPLAY_NAMES.popitem(last=False)
+    return names
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+认证服务层（异步接口）
+与 auth_service 同名同参；阻塞的 SQLite 调用放到线程中执行，
+写操作仍经单写线程批量提交，不占用事件循环
+"""
+
+import asyncio
+from typing import Dict, Any, Optional
+
+from . import auth_service
+
+
+async def upsert_user(user_id: str, display_name: Optional[str] = None,
+                      avatar_url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    注册或更新用户信息。扫码成功后调用。
+    """
+    return await asyncio.to_thread(auth_service.upsert_user, user_id, display_name, avatar_url)
+
+
+async def create_session(user_id: str, ttl_seconds: int = 7 * 24 * 3600,
+                         user_agent: Optional[str] = None,
+                         ip_address: Optional[str] = None) -> Dict[str, Any]:
+    """
+    为指定用户创建平台会话。返回 session_id 和过期时间。
+    """
+    return await asyncio.to_thread(auth_service.create_session, user_id, ttl_seconds,
+                                   user_agent, ip_address)
+
+
+async def verify_session(session_id: str) -> Optional[Dict[str, Any]]:
+    """
+    验证session并返回用户信息
+    """
+    return await asyncio.to_thread(auth_service.verify_session, session_id)
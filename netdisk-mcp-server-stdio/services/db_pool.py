@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库连接池
+复用已设置好 PRAGMA 的 SQLite 连接，避免每次请求重新建连、重放 PRAGMA；
+读连接按需借还，写操作经唯一的写连接串行执行（BEGIN IMMEDIATE）
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from .db import init_sync_db, apply_pragmas, CACHED_STATEMENTS
+
+# 每完成这么多次写事务，在写连接上执行一次 PRAGMA optimize，
+# 让通知/购买记录等高频增长表的统计信息跟上数据量变化
+OPTIMIZE_EVERY = 1000
+
+# writer(busy_retries=N) 时 BEGIN IMMEDIATE 因锁冲突失败后的重试间隔（秒）
+BUSY_RETRY_DELAY = 0.25
+
+
+class PooledConnection:
+    """
+    池化连接代理
+    close() 将连接归还连接池而非真正关闭；用作 with 上下文时
+    正常退出提交、异常退出回滚，然后归还连接
+    """
+
+    def __init__(self, pool: "ConnectionPool", conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        finally:
+            self.close()
+        return False
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+
+class ConnectionPool:
+    """
+    SQLite 连接池
+    空闲连接放在 LIFO 队列中（最近用过的连接页缓存最热）；
+    池空时临时新建，归还时池满则直接关闭。
+    另持有一个专用写连接，由进程级写锁保护
+    """
+
+    def __init__(self, db_path: str, max_size: int = os.cpu_count() or 8):
+        self.db_path = db_path
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=max_size)
+        self._write_lock = threading.Lock()
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        self._writer_owner: Optional[int] = None
+        self._writer_depth = 0
+        self._writes_since_optimize = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+        apply_pragmas(conn)
+        return conn
+
+    def _idle_or_new(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def acquire(self) -> PooledConnection:
+        return PooledConnection(self, self._idle_or_new())
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        try:
+            # 归还前清理调用方遗留的事务与 row_factory，避免污染下一个使用者
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+            self._idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """借出一个读连接，退出时归还（WAL 下与写连接并行）"""
+        conn = self._idle_or_new()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def writer(self, foreign_keys: bool = True, busy_retries: int = 0) -> Iterator[sqlite3.Connection]:
+        """
+        获取写连接并开启 BEGIN IMMEDIATE 事务：正常退出提交、异常退出回滚
+        同一线程内嵌套调用复用外层事务，以 SAVEPOINT 隔离内层的回滚
+        foreign_keys=False 用于沿用历史上不启用外键约束的写路径
+        busy_retries：busy_timeout 耗尽仍拿不到写锁时，在同一连接上重试 BEGIN IMMEDIATE 的次数
+        """
+        if self._writer_owner == threading.get_ident():
+            conn = self._writer_conn
+            self._writer_depth += 1
+            savepoint = f'sp_writer_{self._writer_depth}'
+            conn.execute(f'SAVEPOINT {savepoint}')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute(f'ROLLBACK TO {savepoint}')
+                conn.execute(f'RELEASE {savepoint}')
+                raise
+            else:
+                conn.execute(f'RELEASE {savepoint}')
+            finally:
+                self._writer_depth -= 1
+            return
+
+        with self._write_lock:
+            if self._writer_conn is None:
+                self._writer_conn = self._connect()
+            conn = self._writer_conn
+            if not foreign_keys:
+                conn.execute('PRAGMA foreign_keys=OFF')
+            self._writer_owner = threading.get_ident()
+            try:
+                self._begin_immediate(conn, busy_retries)
+                try:
+                    yield conn
+                except BaseException:
+                    conn.rollback()
+                    raise
+                else:
+                    conn.commit()
+                    self._maybe_optimize(conn)
+            finally:
+                self._writer_owner = None
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.row_factory = None
+                if not foreign_keys:
+                    conn.execute('PRAGMA foreign_keys=ON')
+
+    @staticmethod
+    def _begin_immediate(conn: sqlite3.Connection, busy_retries: int) -> None:
+        for attempt in range(busy_retries + 1):
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError as exc:
+                if 'locked' not in str(exc) or attempt == busy_retries:
+                    raise
+                time.sleep(BUSY_RETRY_DELAY)
+
+    def _maybe_optimize(self, conn: sqlite3.Connection) -> None:
+        """
+        写事务提交后计数，每 OPTIMIZE_EVERY 次执行 PRAGMA optimize（按需 ANALYZE）
+        持有池写锁、在事务外执行，不与池内其他写事务交错；WAL 下不阻塞读连接
+        """
+        self._writes_since_optimize += 1
+        if self._writes_since_optimize < OPTIMIZE_EVERY:
+            return
+        self._writes_since_optimize = 0
+        try:
+            conn.execute('PRAGMA optimize')
+        except sqlite3.Error:
+            pass
+
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """获取进程级连接池（首次调用时初始化数据库）"""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ConnectionPool(init_sync_db())
+    return _POOL
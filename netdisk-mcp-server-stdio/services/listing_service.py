@@ -5,11 +5,10 @@
 包含商品创建、审核、交付等功能
 """
 
-import sqlite3
-import secrets
 import time
 from typing import Dict, Any, List, Optional
-from .db import init_sync_db
+from .db_pool import get_pool
+from . import notify_service as _notify
 
 def _normalize_listing_type(input_type: str) -> str:
     """将前端传入的 listing_type 规范化为内部存储值。"""
@@ -44,52 +43,48 @@ def create_listing(seller_id: str, title: str, price_cents: int,
     if normalized_type not in allowed_types:
         return {"status": "error", "message": "invalid listing_type"}
     
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
+    # 校验文件类型与扩展名匹配（若提供了文件）；在取写连接之前完成，不占用写锁
+    if files:
+        def _ext(name: Optional[str]) -> str:
+            if not name:
+                return ""
+            n = str(name)
+            return n.rsplit('.', 1)[-1].lower() if '.' in n else ""
+        allowed_by_type = {
+            "document": {"pdf","doc","docx","xls","xlsx","ppt","pptx","txt","md","rtf","csv","epub","odt","ods"},
+            "drawing": {"dwg"}  # 如需支持 dxf，可添加到集合中
+        }
+        allow_exts = allowed_by_type.get(normalized_type, set())
+        if allow_exts:
+            for fi in files:
+                name = (fi or {}).get('file_name') or (fi or {}).get('file_path') or ""
+                if _ext(name) not in allow_exts:
+                    return {"status": "error", "message": f"文件类型与所选商品类型不匹配：仅允许 {', '.join(sorted(allow_exts))}"}
+
     try:
-        # 校验文件类型与扩展名匹配（若提供了文件）
-        if files:
-            def _ext(name: Optional[str]) -> str:
-                if not name:
-                    return ""
-                n = str(name)
-                return n.rsplit('.', 1)[-1].lower() if '.' in n else ""
-            allowed_by_type = {
-                "document": {"pdf","doc","docx","xls","xlsx","ppt","pptx","txt","md","rtf","csv","epub","odt","ods"},
-                "drawing": {"dwg"}  # 如需支持 dxf，可添加到集合中
-            }
-            allow_exts = allowed_by_type.get(normalized_type, set())
-            if allow_exts:
-                for fi in files:
-                    name = (fi or {}).get('file_name') or (fi or {}).get('file_path') or ""
-                    if _ext(name) not in allow_exts:
-                        return {"status": "error", "message": f"文件类型与所选商品类型不匹配：仅允许 {', '.join(sorted(allow_exts))}"}
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
 
-        # 插入商品记录
-        cursor.execute('''
-            INSERT INTO listings (seller_id, title, description, listing_type, 
-                                price_cents, status, review_status)
-            VALUES (?, ?, ?, ?, ?, 'draft', 'pending')
-        ''', (seller_id, title, description, normalized_type, price_cents))
-        
-        listing_id = cursor.lastrowid
-        
-        # 插入文件记录
-        if files:
-            for file_info in files:
-                cursor.execute('''
+            # 插入商品记录
+            cursor.execute('''
+                INSERT INTO listings (seller_id, title, description, listing_type, 
+                                    price_cents, status, review_status)
+                VALUES (?, ?, ?, ?, ?, 'draft', 'pending')
+            ''', (seller_id, title, description, normalized_type, price_cents))
+            
+            listing_id = cursor.lastrowid
+            
+            # 插入文件记录（一次 executemany，复用同一条预编译语句）
+            if files:
+                cursor.executemany('''
                     INSERT INTO listing_files (listing_id, file_path, file_name, 
                                              file_size, file_md5)
                     VALUES (?, ?, ?, ?, ?)
-                ''', (listing_id, 
-                      file_info.get('file_path', ''),
-                      file_info.get('file_name', ''),
-                      file_info.get('file_size'),
-                      file_info.get('file_md5')))
-        
-        conn.commit()
+                ''', [(listing_id,
+                       file_info.get('file_path', ''),
+                       file_info.get('file_name', ''),
+                       file_info.get('file_size'),
+                       file_info.get('file_md5')) for file_info in files])
         
         return {
             "status": "success",
@@ -98,40 +93,31 @@ def create_listing(seller_id: str, title: str, price_cents: int,
         }
         
     except Exception as exc:
-        conn.rollback()
         return {"status": "error", "message": str(exc)}
-    finally:
-        conn.close()
 
 def submit_listing_for_review(listing_id: int) -> Dict[str, Any]:
     """
     提交商品审核
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        conn.execute('BEGIN TRANSACTION')
-        
-        query = cursor.execute('SELECT id FROM listings WHERE id = ?', (listing_id,))
-        if not query.fetchone():
-            return {"status": "error", "message": "listing not found"}
-        
-        # 更新商品状态为待审核
-        cursor.execute('''
-            UPDATE listings 
-            SET status = 'pending', updated_at = ?
-            WHERE id = ?
-        ''', (time.time(), listing_id))
-        
-        # 创建审核记录
-        cursor.execute('''
-            INSERT INTO listing_reviews (listing_id, status)
-            VALUES (?, 'pending')
-        ''', (listing_id,))
-        
-        conn.commit()
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
+            
+            # 更新商品状态为待审核；未命中任何行即商品不存在
+            cursor.execute('''
+                UPDATE listings 
+                SET status = 'pending', updated_at = ?
+                WHERE id = ?
+                RETURNING id
+            ''', (time.time(), listing_id))
+            if not cursor.fetchone():
+                return {"status": "error", "message": "listing not found"}
+            
+            # 创建审核记录
+            cursor.execute('''
+                INSERT INTO listing_reviews (listing_id, status)
+                VALUES (?, 'pending')
+            ''', (listing_id,))
         
         return {
             "status": "success",
@@ -139,51 +125,39 @@ def submit_listing_for_review(listing_id: int) -> Dict[str, Any]:
         }
         
     except Exception as exc:
-        conn.rollback()
         return {"status": "error", "message": str(exc)}
-    finally:
-        conn.close()
 
 def approve_listing(listing_id: int, reviewer_id: str, remark: str = "") -> Dict[str, Any]:
     """
     审核通过商品
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
+    now = time.time()  # 同一事务内的各时间字段共用一个时间戳
     try:
-        conn.execute('BEGIN TRANSACTION')
-        
-        # 获取商品信息
-        cursor.execute('''
-            SELECT seller_id, title FROM listings WHERE id = ?
-        ''', (listing_id,))
-        
-        listing_row = cursor.fetchone()
-        if not listing_row:
-            return {"status": "error", "message": "listing not found"}
-        
-        seller_id, title = listing_row
-        
-        # 更新商品状态
-        cursor.execute('''
-            UPDATE listings 
-            SET status = 'live', review_status = 'approved', updated_at = ?, published_at = ?
-            WHERE id = ?
-        ''', (time.time(), time.time(), listing_id))
-        
-        # 创建审核记录
-        cursor.execute('''
-            INSERT INTO listing_reviews (listing_id, reviewer_id, status, remark, reviewed_at)
-            VALUES (?, ?, 'approved', ?, ?)
-        ''', (listing_id, reviewer_id, remark, time.time()))
-        
-        conn.commit()
-        
-        # 发送审核通过通知
-        from .notify_service import send_listing_approved_notification
-        send_listing_approved_notification(seller_id, listing_id, title)
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
+            
+            # 更新商品状态并取回商品信息；未命中任何行即商品不存在
+            cursor.execute('''
+                UPDATE listings 
+                SET status = 'live', review_status = 'approved', updated_at = ?, published_at = ?
+                WHERE id = ?
+                RETURNING seller_id, title
+            ''', (now, now, listing_id))
+            
+            listing_row = cursor.fetchone()
+            if not listing_row:
+                return {"status": "error", "message": "listing not found"}
+            
+            seller_id, title = listing_row
+            
+            # 创建审核记录
+            cursor.execute('''
+                INSERT INTO listing_reviews (listing_id, reviewer_id, status, remark, reviewed_at)
+                VALUES (?, ?, 'approved', ?, ?)
+            ''', (listing_id, reviewer_id, remark, now))
+            
+            # 发送审核通过通知：嵌套写事务（SAVEPOINT），与状态变更一次提交
+            _notify.send_listing_approved_notification(seller_id, listing_id, title)
         
         return {
             "status": "success",
@@ -191,51 +165,39 @@ def approve_listing(listing_id: int, reviewer_id: str, remark: str = "") -> Dict
         }
         
     except Exception as exc:
-        conn.rollback()
         return {"status": "error", "message": str(exc)}
-    finally:
-        conn.close()
 
 def reject_listing(listing_id: int, reviewer_id: str, reason: str) -> Dict[str, Any]:
     """
     审核拒绝商品
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
+    now = time.time()  # 同一事务内的各时间字段共用一个时间戳
     try:
-        conn.execute('BEGIN TRANSACTION')
-        
-        # 获取商品信息
-        cursor.execute('''
-            SELECT seller_id, title FROM listings WHERE id = ?
-        ''', (listing_id,))
-        
-        listing_row = cursor.fetchone()
-        if not listing_row:
-            return {"status": "error", "message": "listing not found"}
-        
-        seller_id, title = listing_row
-        
-        # 更新商品状态
-        cursor.execute('''
-            UPDATE listings 
-            SET status = 'rejected', review_status = 'rejected', updated_at = ?
-            WHERE id = ?
-        ''', (time.time(), listing_id))
-        
-        # 创建审核记录
-        cursor.execute('''
-            INSERT INTO listing_reviews (listing_id, reviewer_id, status, remark, reviewed_at)
-            VALUES (?, ?, 'rejected', ?, ?)
-        ''', (listing_id, reviewer_id, reason, time.time()))
-        
-        conn.commit()
-        
-        # 发送审核拒绝通知
-        from .notify_service import send_listing_rejected_notification
-        send_listing_rejected_notification(seller_id, listing_id, title, reason)
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
+            
+            # 更新商品状态并取回商品信息；未命中任何行即商品不存在
+            cursor.execute('''
+                UPDATE listings 
+                SET status = 'rejected', review_status = 'rejected', updated_at = ?
+                WHERE id = ?
+                RETURNING seller_id, title
+            ''', (now, listing_id))
+            
+            listing_row = cursor.fetchone()
+            if not listing_row:
+                return {"status": "error", "message": "listing not found"}
+            
+            seller_id, title = listing_row
+            
+            # 创建审核记录
+            cursor.execute('''
+                INSERT INTO listing_reviews (listing_id, reviewer_id, status, remark, reviewed_at)
+                VALUES (?, ?, 'rejected', ?, ?)
+            ''', (listing_id, reviewer_id, reason, now))
+            
+            # 发送审核拒绝通知：嵌套写事务（SAVEPOINT），与状态变更一次提交
+            _notify.send_listing_rejected_notification(seller_id, listing_id, title, reason)
         
         return {
             "status": "success",
@@ -243,70 +205,37 @@ def reject_listing(listing_id: int, reviewer_id: str, reason: str) -> Dict[str,
         }
         
     except Exception as exc:
-        conn.rollback()
         return {"status": "error", "message": str(exc)}
-    finally:
-        conn.close()
 
 def deliver_order(order_id: int) -> Dict[str, Any]:
     """
     交付订单：为每个 order_item 在 user_purchases 中创建记录
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        conn.execute('BEGIN TRANSACTION')
-        
-        # 获取订单信息
-        cursor.execute('''
-            SELECT buyer_id FROM orders WHERE id = ?
-        ''', (order_id,))
-        
-        buyer_row = cursor.fetchone()
-        if not buyer_row:
-            return {"status": "error", "message": "order not found"}
-        
-        buyer_id = buyer_row[0]
-        
-        # 获取订单项
-        cursor.execute('''
-            SELECT listing_id FROM order_items WHERE order_id = ?
-        ''', (order_id,))
-        
-        order_items = cursor.fetchall()
-        
-        # 为每个商品创建购买记录
-        delivered_count = 0
-        for item_row in order_items:
-            listing_id = item_row[0]
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
             
-            # 获取商品文件列表
+            # 订单、订单项与商品文件联表，一条 INSERT ... SELECT 写入全部购买记录
             cursor.execute('''
-                SELECT file_path FROM listing_files WHERE listing_id = ?
-            ''', (listing_id,))
+                INSERT OR IGNORE INTO user_purchases 
+                (order_id, listing_id, buyer_id, file_path)
+                SELECT oi.order_id, oi.listing_id, o.buyer_id, lf.file_path
+                FROM order_items oi
+                JOIN orders o ON o.id = oi.order_id
+                JOIN listing_files lf ON lf.listing_id = oi.listing_id
+                WHERE oi.order_id = ?
+            ''', (order_id,))
             
-            files = cursor.fetchall()
+            delivered_count = cursor.rowcount
+            if delivered_count == 0:
+                cursor.execute('SELECT 1 FROM orders WHERE id = ?', (order_id,))
+                if not cursor.fetchone():
+                    return {"status": "error", "message": "order not found"}
             
-            # 为每个文件创建购买记录
-            for file_row in files:
-                file_path = file_row[0]
-                
-                cursor.execute('''
-                    INSERT OR IGNORE INTO user_purchases 
-                    (order_id, listing_id, buyer_id, file_path)
-                    VALUES (?, ?, ?, ?)
-                ''', (order_id, listing_id, buyer_id, file_path))
-                
-                delivered_count += 1
-        
-        # 更新订单项的交付时间
-        cursor.execute('''
-            UPDATE order_items SET delivered_at = ? WHERE order_id = ?
-        ''', (time.time(), order_id))
-        
-        conn.commit()
+            # 更新订单项的交付时间
+            cursor.execute('''
+                UPDATE order_items SET delivered_at = ? WHERE order_id = ?
+            ''', (time.time(), order_id))
         
         return {
             "status": "success",
@@ -315,7 +244,4 @@ def deliver_order(order_id: int) -> Dict[str, Any]:
         }
         
     except Exception as exc:
-        conn.rollback()
         return {"status": "error", "message": str(exc)}
-    finally:
-        conn.close()
@@ -5,10 +5,110 @@
 包含消息推送、通知管理等功能
 """
 
+import atexit
+import functools
+import json
+import queue
 import sqlite3
+import threading
 import time
 from typing import Dict, Any, List, Optional, Iterable
-from .db import init_sync_db
+from .db_pool import get_pool
+
+# 通知写入 SQL：模块级常量，create/dispatch 及各 send_* 共用同一条预编译语句
+_SQL_INSERT_NOTIFICATION = '''
+    INSERT INTO notifications (
+        user_id, title, content, type, status, sender_role, created_at,
+        target_scope, target_role, channel, metadata
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def _dumps(value: Optional[Dict[str, Any]]) -> Optional[str]:
+    """metadata/extra 序列化为紧凑 JSON（可被 json.loads / json_extract 解析）"""
+    return None if value is None else json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=str)
+
+def _insert_notification(conn, row: tuple) -> int:
+    """在调用方的事务内写入一条通知，返回通知 ID"""
+    return conn.execute(_SQL_INSERT_NOTIFICATION, row).lastrowid
+
+# 异步通知写入队列：调用方只入队，后台线程每批最多 NOTIFY_BATCH_SIZE 条、
+# 最长等待 NOTIFY_BATCH_WAIT 秒，合并为一次 executemany 在同一写事务内提交
+NOTIFY_BATCH_SIZE = 256
+NOTIFY_BATCH_WAIT = 0.01
+_NOTIFY_QUEUE: "queue.Queue[tuple]" = queue.Queue()
+_NOTIFY_THREAD: Optional[threading.Thread] = None
+_NOTIFY_THREAD_LOCK = threading.Lock()
+
+def _enqueue_notification(row: tuple) -> None:
+    global _NOTIFY_THREAD
+    if _NOTIFY_THREAD is None:
+        with _NOTIFY_THREAD_LOCK:
+            if _NOTIFY_THREAD is None:
+                _NOTIFY_THREAD = threading.Thread(target=_drain_notifications, name="notify-writer", daemon=True)
+                _NOTIFY_THREAD.start()
+    _NOTIFY_QUEUE.put(row)
+
+def _drain_notifications() -> None:
+    while True:
+        batch = [_NOTIFY_QUEUE.get()]
+        deadline = time.monotonic() + NOTIFY_BATCH_WAIT
+        while len(batch) < NOTIFY_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_NOTIFY_QUEUE.get(timeout=remaining))
+            except queue.Empty:
+                break
+        try:
+            _write_notification_batch(batch)
+        finally:
+            for _ in batch:
+                _NOTIFY_QUEUE.task_done()
+
+def _write_notification_batch(batch: List[tuple]) -> None:
+    """
+    整批写入；整批失败（如某行数据非法）时逐条重试，只有仍然失败的那一条被丢弃
+    """
+    try:
+        with get_pool().writer(foreign_keys=False) as conn:
+            conn.executemany(_SQL_INSERT_NOTIFICATION, batch)
+        return
+    except Exception as e:
+        if len(batch) == 1:
+            print(f"通知写入失败（user_id={batch[0][0]}, title={batch[0][1]}）: {e}")
+            return
+    for row in batch:
+        try:
+            with get_pool().writer(foreign_keys=False) as conn:
+                _insert_notification(conn, row)
+        except Exception as e:
+            print(f"通知写入失败（user_id={row[0]}, title={row[1]}）: {e}")
+
+def flush_notifications() -> None:
+    """
+    把异步队列中剩余的通知全部写入并等待后台批次完成（停机前或测试中调用）
+    在调用线程内直接取队列写库，不依赖 daemon 写线程仍在运行
+    """
+    while True:
+        batch = []
+        while len(batch) < NOTIFY_BATCH_SIZE:
+            try:
+                batch.append(_NOTIFY_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            break
+        try:
+            _write_notification_batch(batch)
+        finally:
+            for _ in batch:
+                _NOTIFY_QUEUE.task_done()
+    # 后台线程已取出、正在写入的批次
+    _NOTIFY_QUEUE.join()
+
+# 进程正常退出时补写队列中剩余的通知（daemon 写线程在退出时会被直接终止）
+atexit.register(flush_notifications)
 
 def create_notification(
     user_id: Optional[str],
@@ -21,42 +121,37 @@ def create_notification(
     target_role: Optional[str] = None,
     channel: str = "inbox",
     metadata: Optional[Dict[str, Any]] = None,
+    sync: bool = True,
 ) -> Dict[str, Any]:
     """
     创建通知
+    sync=False 时只加入异步写入队列并立即返回（不含 notification_id），适用于无需确认的业务提醒
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
+    # 如果sender_role为None，使用默认值
+    if sender_role is None:
+        sender_role = "system"
+    # 校验类型与范围
+    if notification_type not in {"info", "success", "warning", "error"}:
+        return {"status": "error", "message": "invalid notification_type"}
+    if target_scope not in {"user", "role", "all"}:
+        return {"status": "error", "message": "invalid target_scope"}
+    if target_scope == "user" and not user_id:
+        return {"status": "error", "message": "user_id required for user scope"}
+    if target_scope in {"role", "all"}:
+        # 兼容：允许 user_id 为空
+        user_id = user_id or "__broadcast__"
+
     try:
-        # 如果sender_role为None，使用默认值
-        if sender_role is None:
-            sender_role = "system"
-        # 校验类型与范围
-        if notification_type not in {"info", "success", "warning", "error"}:
-            return {"status": "error", "message": "invalid notification_type"}
-        if target_scope not in {"user", "role", "all"}:
-            return {"status": "error", "message": "invalid target_scope"}
-        if target_scope == "user" and not user_id:
-            return {"status": "error", "message": "user_id required for user scope"}
-        if target_scope in {"role", "all"}:
-            # 兼容：允许 user_id 为空
-            user_id = user_id or "__broadcast__"
-            
-        cursor.execute('''
-            INSERT INTO notifications (
-                user_id, title, content, type, status, sender_role, created_at,
-                target_scope, target_role, channel, metadata
-            )
-            VALUES (?, ?, ?, ?, 'unread', ?, ?, ?, ?, ?, ?)
-        ''', (
-            user_id, title, content, notification_type, sender_role, time.time(),
-            target_scope, target_role, channel, (None if metadata is None else str(metadata))
-        ))
-        
-        notification_id = cursor.lastrowid
-        conn.commit()
+        row = (
+            user_id, title, content, notification_type, 'unread', sender_role, time.time(),
+            target_scope, target_role, channel, _dumps(metadata)
+        )
+        if not sync:
+            _enqueue_notification(row)
+            return {"status": "success", "queued": True, "message": "通知已加入发送队列"}
+
+        with get_pool().writer(foreign_keys=False) as conn:
+            notification_id = _insert_notification(conn, row)
         
         return {
             "status": "success",
@@ -66,8 +161,6 @@ def create_notification(
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
 
 
 def dispatch_notifications(
@@ -84,96 +177,104 @@ def dispatch_notifications(
 ) -> Dict[str, Any]:
     """将按角色/全员广播拆分为具体用户记录，或按用户集合批量插入。
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    try:
-        if sender_role is None:
-            sender_role = "system"
-        if notification_type not in {"info", "success", "warning", "error"}:
-            return {"status": "error", "message": "invalid notification_type"}
-        if target_scope not in {"user", "role", "all"}:
-            return {"status": "error", "message": "invalid target_scope"}
-
-        # 解析目标用户
-        targets: List[str] = []
-        if target_scope == "user":
-            if not user_ids:
-                return {"status": "error", "message": "user_ids required for user scope"}
-            targets = list(user_ids)
-        elif target_scope == "role":
-            if not target_role:
-                return {"status": "error", "message": "target_role required for role scope"}
-            cursor.execute("SELECT user_id FROM users WHERE role = ?", (target_role,))
-            targets = [row[0] for row in cursor.fetchall()]
-        else:  # all
-            cursor.execute("SELECT user_id FROM users")
-            targets = [row[0] for row in cursor.fetchall()]
+    if sender_role is None:
+        sender_role = "system"
+    if notification_type not in {"info", "success", "warning", "error"}:
+        return {"status": "error", "message": "invalid notification_type"}
+    if target_scope not in {"user", "role", "all"}:
+        return {"status": "error", "message": "invalid target_scope"}
+    if target_scope == "user" and not user_ids:
+        return {"status": "error", "message": "user_ids required for user scope"}
+    if target_scope == "role" and not target_role:
+        return {"status": "error", "message": "target_role required for role scope"}
 
-        now_ts = time.time()
-        rows = [
-            (
-                uid,
-                title,
-                content,
-                notification_type,
-                'unread',
-                sender_role,
-                now_ts,
-                target_scope,
-                target_role,
-                channel,
-                (None if metadata is None else str(metadata))
-            )
-            for uid in targets
-        ]
-        if not rows:
-            return {"status": "success", "inserted": 0}
-        cursor.executemany('''
-            INSERT INTO notifications (
-                user_id, title, content, type, status, sender_role, created_at,
-                target_scope, target_role, channel, metadata
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', rows)
-        conn.commit()
-        return {"status": "success", "inserted": len(rows)}
+    try:
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
+
+            now_ts = time.time()
+            metadata_json = _dumps(metadata)
+
+            if target_scope == "user":
+                # 生成器逐行喂给 executemany，不预先构造整份参数列表
+                rows = (
+                    (
+                        uid,
+                        title,
+                        content,
+                        notification_type,
+                        'unread',
+                        sender_role,
+                        now_ts,
+                        target_scope,
+                        target_role,
+                        channel,
+                        metadata_json
+                    )
+                    for uid in user_ids
+                )
+                cursor.executemany(_SQL_INSERT_NOTIFICATION, rows)
+                inserted = cursor.rowcount
+            else:
+                # 角色/全员广播：INSERT ... SELECT 直接由 users 表展开，不在 Python 中物化用户列表
+                role_filter = " WHERE role = ?" if target_scope == "role" else ""
+                params: List[Any] = [title, content, notification_type, sender_role, now_ts,
+                                     target_scope, target_role, channel, metadata_json]
+                if target_scope == "role":
+                    params.append(target_role)
+                cursor.execute(f'''
+                    INSERT INTO notifications (
+                        user_id, title, content, type, status, sender_role, created_at,
+                        target_scope, target_role, channel, metadata
+                    )
+                    SELECT user_id, ?, ?, ?, 'unread', ?, ?, ?, ?, ?, ?
+                    FROM users{role_filter}
+                ''', params)
+                inserted = cursor.rowcount
+        return {"status": "success", "inserted": inserted}
     except Exception as e:
-        conn.rollback()
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
 
 def get_user_notifications(user_id: str, limit: int = 20, offset: int = 0, 
-                          status: Optional[str] = None) -> Dict[str, Any]:
+                          status: Optional[str] = None,
+                          before_ts: Optional[float] = None) -> Dict[str, Any]:
     """
     获取用户通知列表
+    传入 before_ts（上一页最后一条的 created_at）时按游标翻页，忽略 offset；
+    多取一条判断 has_more，不再额外 COUNT（总数见 get_notification_stats）
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
         # 构建查询条件
         where_conditions = ["user_id = ?"]
-        params = [user_id]
+        params: List[Any] = [user_id]
         
         if status and status != "all":
             where_conditions.append("status = ?")
             params.append(status)
+        if before_ts is not None:
+            where_conditions.append("created_at < ?")
+            params.append(before_ts)
+            offset = 0
         
         where_clause = " AND ".join(where_conditions)
         
-        # 获取通知列表
-        cursor.execute(f'''
-            SELECT id, title, content, type, status, sender_role, created_at, read_at
-            FROM notifications 
-            WHERE {where_clause}
-            ORDER BY created_at DESC
-            LIMIT ? OFFSET ?
-        ''', params + [limit, offset])
+        with get_pool().reader() as conn:
+            cursor = conn.cursor()
+
+            # 获取通知列表
+            cursor.execute(f'''
+                SELECT id, title, content, type, status, sender_role, created_at, read_at
+                FROM notifications 
+                WHERE {where_clause}
+                ORDER BY created_at DESC
+                LIMIT ? OFFSET ?
+            ''', params + [limit + 1, offset])
+            rows = cursor.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
         notifications = []
-        for row in cursor.fetchall():
+        for row in rows:
             notifications.append({
                 "id": row[0],
                 "title": row[1],
@@ -185,25 +286,69 @@ def get_user_notifications(user_id: str, limit: int = 20, offset: int = 0,
                 "read_at": row[7]
             })
         
-        # 获取总数
-        cursor.execute(f'''
-            SELECT COUNT(*) FROM notifications WHERE {where_clause}
-        ''', params)
-        
-        total = cursor.fetchone()[0]
-        
         return {
             "status": "success",
             "notifications": notifications,
-            "total": total,
+            "has_more": has_more,
+            "next_before_ts": notifications[-1]["created_at"] if has_more else None,
             "limit": limit,
             "offset": offset
         }
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
+
+
+def get_notification_stats(user_id: str) -> Dict[str, Any]:
+    """
+    用户通知统计：总数与未读数（一次扫描 idx_notif_user_status_created）
+    """
+    try:
+        with get_pool().reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*), COALESCE(SUM(status = 'unread'), 0)
+                FROM notifications WHERE user_id = ?
+            ''', (user_id,))
+            total, unread = cursor.fetchone()
+        return {
+            "status": "success",
+            "total_count": total,
+            "unread_count": unread
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+# 高级查询可用的筛选条件（顺序固定，决定 SQL 文本与参数顺序）
+_ADVANCED_FILTERS = {
+    "user_id": "user_id = ?",
+    "status": "status = ?",
+    "type": "type = ?",
+    "since": "created_at >= ?",
+    "until": "created_at <= ?",
+    "channel": "channel = ?",
+    "target_scope": "target_scope = ?",
+    "target_role": "target_role = ?",
+    # 与 idx_notif_meta_kind 的索引表达式保持一致
+    "metadata_kind": "json_extract(metadata, '$.kind') = ?",
+}
+
+@functools.lru_cache(maxsize=256)
+def _advanced_query_sql(active: tuple) -> str:
+    """
+    按启用的筛选条件组合生成并缓存 SQL；同一组合始终得到同一文本，命中连接的语句缓存
+    （未采用 "(? IS NULL OR col = ?)" 单条 SQL：该写法令规划器无法使用 user_id 等索引）
+    """
+    where_clause = (" WHERE " + " AND ".join(_ADVANCED_FILTERS[name] for name in active)) if active else ""
+    return f'''
+        SELECT id, user_id, title, content, type, status, sender_role, created_at, read_at,
+               target_scope, target_role, channel, metadata
+        FROM notifications
+        {where_clause}
+        ORDER BY created_at DESC
+        LIMIT ? OFFSET ?
+    '''
 
 
 def get_notifications_advanced(
@@ -218,65 +363,38 @@ def get_notifications_advanced(
     channel: Optional[str] = None,
     target_scope: Optional[str] = None,
     target_role: Optional[str] = None,
+    metadata_kind: Optional[str] = None,
 ) -> Dict[str, Any]:
     """通用查询（支持分页与筛选），向下兼容现有结构。"""
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
     try:
-        where = []
-        params: List[Any] = []
-        if user_id:
-            where.append("user_id = ?"); params.append(user_id)
-        if status and status != "all":
-            where.append("status = ?"); params.append(status)
-        if type_filter:
-            where.append("type = ?"); params.append(type_filter)
-        if since is not None:
-            where.append("created_at >= ?"); params.append(since)
-        if until is not None:
-            where.append("created_at <= ?"); params.append(until)
-        if channel:
-            where.append("channel = ?"); params.append(channel)
-        if target_scope:
-            where.append("target_scope = ?"); params.append(target_scope)
-        if target_role:
-            where.append("target_role = ?"); params.append(target_role)
-        where_clause = (" WHERE " + " AND ".join(where)) if where else ""
+        filters = (
+            ("user_id", user_id or None),
+            ("status", status if status and status != "all" else None),
+            ("type", type_filter or None),
+            ("since", since),
+            ("until", until),
+            ("channel", channel or None),
+            ("target_scope", target_scope or None),
+            ("target_role", target_role or None),
+            ("metadata_kind", metadata_kind or None),
+        )
+        active = tuple(name for name, value in filters if value is not None)
+        params: List[Any] = [value for _, value in filters if value is not None]
 
         size = max(1, min(int(size), 100))
         page = max(1, int(page))
         offset = (page - 1) * size
 
-        cursor.execute(f'''
-            SELECT id, user_id, title, content, type, status, sender_role, created_at, read_at,
-                   target_scope, target_role, channel, metadata
-            FROM notifications
-            {where_clause}
-            ORDER BY created_at DESC
-            LIMIT ? OFFSET ?
-        ''', params + [size + 1, offset])
-        rows = cursor.fetchall()
+        with get_pool().reader() as conn:
+            cursor = conn.cursor()
+            # 列名即返回字段名，sqlite3.Row 直接转 dict，省去逐列下标取值
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(_advanced_query_sql(active), params + [size + 1, offset])
+            rows = cursor.fetchall()
         has_more = len(rows) > size
         rows = rows[:size]
 
-        items = []
-        for r in rows:
-            items.append({
-                "id": r[0],
-                "user_id": r[1],
-                "title": r[2],
-                "content": r[3],
-                "type": r[4],
-                "status": r[5],
-                "sender_role": r[6],
-                "created_at": r[7],
-                "read_at": r[8],
-                "target_scope": r[9],
-                "target_role": r[10],
-                "channel": r[11],
-                "metadata": r[12],
-            })
+        items = [dict(r) for r in rows]
 
         return {
             "status": "success",
@@ -288,8 +406,6 @@ def get_notifications_advanced(
         }
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
 
 
 def record_notification_event(
@@ -302,24 +418,19 @@ def record_notification_event(
     """写入通知事件，支持 read/view/click。"""
     if event not in {"read", "view", "click"}:
         return {"status": "error", "message": "invalid event"}
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
     try:
         now_ts = time.time()
         read_at = now_ts if event == "read" else None
         viewed_at = now_ts if event == "view" else None
-        cursor.execute('''
-            INSERT INTO notification_events (notification_id, user_id, event, read_at, viewed_at, extra, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (notification_id, user_id, event, read_at, viewed_at, (None if extra is None else str(extra)), now_ts))
-        conn.commit()
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO notification_events (notification_id, user_id, event, read_at, viewed_at, extra, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (notification_id, user_id, event, read_at, viewed_at, _dumps(extra), now_ts))
         return {"status": "success", "event_id": cursor.lastrowid}
     except Exception as e:
-        conn.rollback()
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
 
 
 def admin_manage_notifications(
@@ -335,15 +446,14 @@ def admin_manage_notifications(
 
 def resend_notification(notification_id: int) -> Dict[str, Any]:
     """简单重发：读取原通知并为同一用户再插入一条相同内容。"""
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
     try:
-        cursor.execute('''
-            SELECT user_id, title, content, type, sender_role, target_scope, target_role, channel, metadata
-            FROM notifications WHERE id = ?
-        ''', (notification_id,))
-        row = cursor.fetchone()
+        with get_pool().reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT user_id, title, content, type, sender_role, target_scope, target_role, channel, metadata
+                FROM notifications WHERE id = ?
+            ''', (notification_id,))
+            row = cursor.fetchone()
         if not row:
             return {"status": "error", "message": "notification not found"}
         return create_notification(
@@ -352,45 +462,54 @@ def resend_notification(notification_id: int) -> Dict[str, Any]:
         )
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
 
 
-def delete_notification(notification_id: int) -> Dict[str, Any]:
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+# 批量删除每条语句的 id 数上限（低于 SQLite 旧版本 999 个绑定参数的限制）
+BULK_DELETE_CHUNK = 900
+
+def bulk_delete_notifications(ids: List[int]) -> Dict[str, Any]:
+    """
+    批量删除通知：按 BULK_DELETE_CHUNK 分段执行 DELETE ... WHERE id IN (...)，全部分段在同一事务内提交
+    """
+    ids = list(dict.fromkeys(ids or ()))
+    if not ids:
+        return {"status": "error", "message": "ids required"}
     try:
-        cursor.execute('DELETE FROM notifications WHERE id = ?', (notification_id,))
-        if cursor.rowcount == 0:
-            return {"status": "error", "message": "notification not found"}
-        conn.commit()
-        return {"status": "success"}
+        deleted = 0
+        with get_pool().writer(foreign_keys=False) as conn:
+            for start in range(0, len(ids), BULK_DELETE_CHUNK):
+                chunk = ids[start:start + BULK_DELETE_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                deleted += conn.execute(
+                    f'DELETE FROM notifications WHERE id IN ({placeholders})', chunk
+                ).rowcount
+        return {"status": "success", "deleted": deleted}
     except Exception as e:
-        conn.rollback()
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
+
+def delete_notification(notification_id: int) -> Dict[str, Any]:
+    resp = bulk_delete_notifications([notification_id])
+    if resp["status"] != "success":
+        return resp
+    if resp["deleted"] == 0:
+        return {"status": "error", "message": "notification not found"}
+    return {"status": "success"}
 
 def mark_notification_read(notification_id: int, user_id: str) -> Dict[str, Any]:
     """
     标记通知为已读
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute('''
-            UPDATE notifications 
-            SET status = 'read', read_at = ?
-            WHERE id = ? AND user_id = ?
-        ''', (time.time(), notification_id, user_id))
-        
-        if cursor.rowcount == 0:
-            return {"status": "error", "message": "通知不存在或无权限"}
-        
-        conn.commit()
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE notifications 
+                SET status = 'read', read_at = ?
+                WHERE id = ? AND user_id = ?
+            ''', (time.time(), notification_id, user_id))
+            
+            if cursor.rowcount == 0:
+                return {"status": "error", "message": "通知不存在或无权限"}
         
         return {
             "status": "success",
@@ -399,26 +518,21 @@ def mark_notification_read(notification_id: int, user_id: str) -> Dict[str, Any]
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
 
 def mark_all_notifications_read(user_id: str) -> Dict[str, Any]:
     """
     标记用户所有通知为已读
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute('''
-            UPDATE notifications 
-            SET status = 'read', read_at = ?
-            WHERE user_id = ? AND status = 'unread'
-        ''', (time.time(), user_id))
-        
-        affected_count = cursor.rowcount
-        conn.commit()
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE notifications 
+                SET status = 'read', read_at = ?
+                WHERE user_id = ? AND status = 'unread'
+            ''', (time.time(), user_id))
+            
+            affected_count = cursor.rowcount
         
         return {
             "status": "success",
@@ -427,24 +541,20 @@ def mark_all_notifications_read(user_id: str) -> Dict[str, Any]:
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
 
 def get_unread_count(user_id: str) -> Dict[str, Any]:
     """
     获取用户未读通知数量
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute('''
-            SELECT COUNT(*) FROM notifications 
-            WHERE user_id = ? AND status = 'unread'
-        ''', (user_id,))
-        
-        count = cursor.fetchone()[0]
+        with get_pool().reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*) FROM notifications 
+                WHERE user_id = ? AND status = 'unread'
+            ''', (user_id,))
+            
+            count = cursor.fetchone()[0]
         
         return {
             "status": "success",
@@ -453,143 +563,93 @@ def get_unread_count(user_id: str) -> Dict[str, Any]:
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
+
+# 业务通知模板：事件 -> (标题, 内容模板, 通知类型, 发送方角色)
+_TEMPLATES = {
+    "payment_success": ("支付成功", "您的订单 {order_id} 支付成功，金额 ¥{amount_yuan:.2f}，商品已交付到您的账户。", "success", "system"),
+    "payout_approved": ("提现审核通过", "您的提现申请 {payout_id} 已审核通过，金额 ¥{amount_yuan:.2f}，请查收。", "success", "admin"),
+    "payout_rejected": ("提现审核未通过", "您的提现申请 {payout_id} 未通过审核，原因：{reason}。资金已解冻。", "warning", "admin"),
+    "order_created": ("新订单", "您有新的订单 {order_id}，买家：{buyer_id}，金额：¥{amount_yuan:.2f}，请及时处理。", "info", "system"),
+    "listing_approved": ("商品审核通过", "您的商品「{title}」已通过审核，现在可以正常销售了。", "success", "admin"),
+    "listing_rejected": ("商品审核未通过", "您的商品「{title}」未通过审核，原因：{reason}。请修改后重新提交。", "warning", "admin"),
+    "order_delivered": ("订单已交付", "您的订单 {order_id} 已交付完成，商品已添加到您的已购清单中。", "success", "system"),
+    "system_maintenance": ("系统维护通知", "{message}", "info", "system"),
+    "payout_paid": ("提现已到账", "您的提现申请已处理完成，金额：¥{amount_yuan:.2f}{remark_suffix}", "success", "admin"),
+}
+
+def _emit(user_id: str, event: str, **fields: Any) -> Dict[str, Any]:
+    """
+    按模板渲染并写入一条业务通知（经池化写连接，复用同一条 INSERT 语句）
+    """
+    if not user_id:
+        return {"status": "error", "message": "user_id required for user scope"}
+    title, template, notification_type, sender_role = _TEMPLATES[event]
+    content = template.format_map(fields)
+    try:
+        with get_pool().writer(foreign_keys=False) as conn:
+            notification_id = _insert_notification(conn, (
+                user_id, title, content, notification_type, 'unread', sender_role, time.time(),
+                'user', None, 'inbox', None
+            ))
+        return {
+            "status": "success",
+            "notification_id": notification_id,
+            "message": "通知创建成功"
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
 
 def send_payment_success_notification(buyer_id: str, order_id: int, amount_cents: int) -> Dict[str, Any]:
     """
     发送支付成功通知
     """
-    title = "支付成功"
-    content = f"您的订单 {order_id} 支付成功，金额 ¥{amount_cents/100:.2f}，商品已交付到您的账户。"
-    
-    return create_notification(
-        user_id=buyer_id,
-        title=title,
-        content=content,
-        notification_type="success",
-        sender_role="system"
-    )
+    return _emit(buyer_id, "payment_success", order_id=order_id, amount_yuan=amount_cents / 100)
 
 def send_payout_approved_notification(seller_id: str, payout_id: int, amount_cents: int) -> Dict[str, Any]:
     """
     发送提现审核通过通知
     """
-    title = "提现审核通过"
-    content = f"您的提现申请 {payout_id} 已审核通过，金额 ¥{amount_cents/100:.2f}，请查收。"
-    
-    return create_notification(
-        user_id=seller_id,
-        title=title,
-        content=content,
-        notification_type="success",
-        sender_role="admin"
-    )
+    return _emit(seller_id, "payout_approved", payout_id=payout_id, amount_yuan=amount_cents / 100)
 
 def send_payout_rejected_notification(seller_id: str, payout_id: int, reason: str) -> Dict[str, Any]:
     """
     发送提现审核拒绝通知
     """
-    title = "提现审核未通过"
-    content = f"您的提现申请 {payout_id} 未通过审核，原因：{reason}。资金已解冻。"
-    
-    return create_notification(
-        user_id=seller_id,
-        title=title,
-        content=content,
-        notification_type="warning",
-        sender_role="admin"
-    )
+    return _emit(seller_id, "payout_rejected", payout_id=payout_id, reason=reason)
 
 def send_order_created_notification(seller_id: str, order_id: int, buyer_id: str, amount_cents: int) -> Dict[str, Any]:
     """
     发送新订单通知给卖家
     """
-    title = "新订单"
-    content = f"您有新的订单 {order_id}，买家：{buyer_id}，金额：¥{amount_cents/100:.2f}，请及时处理。"
-    
-    return create_notification(
-        user_id=seller_id,
-        title=title,
-        content=content,
-        notification_type="info",
-        sender_role="system"
-    )
+    return _emit(seller_id, "order_created", order_id=order_id, buyer_id=buyer_id, amount_yuan=amount_cents / 100)
 
 def send_listing_approved_notification(seller_id: str, listing_id: int, title: str) -> Dict[str, Any]:
     """
     发送商品审核通过通知
     """
-    title_text = "商品审核通过"
-    content = f"您的商品「{title}」已通过审核，现在可以正常销售了。"
-    
-    return create_notification(
-        user_id=seller_id,
-        title=title_text,
-        content=content,
-        notification_type="success",
-        sender_role="admin"
-    )
+    return _emit(seller_id, "listing_approved", title=title)
 
 def send_listing_rejected_notification(seller_id: str, listing_id: int, title: str, reason: str) -> Dict[str, Any]:
     """
     发送商品审核拒绝通知
     """
-    title_text = "商品审核未通过"
-    content = f"您的商品「{title}」未通过审核，原因：{reason}。请修改后重新提交。"
-    
-    return create_notification(
-        user_id=seller_id,
-        title=title_text,
-        content=content,
-        notification_type="warning",
-        sender_role="admin"
-    )
+    return _emit(seller_id, "listing_rejected", title=title, reason=reason)
 
 def send_order_delivered_notification(buyer_id: str, order_id: int, seller_id: str) -> Dict[str, Any]:
     """
     发送订单交付通知给买家
     """
-    title = "订单已交付"
-    content = f"您的订单 {order_id} 已交付完成，商品已添加到您的已购清单中。"
-    
-    return create_notification(
-        user_id=buyer_id,
-        title=title,
-        content=content,
-        notification_type="success",
-        sender_role="system"
-    )
+    return _emit(buyer_id, "order_delivered", order_id=order_id)
 
 def send_system_maintenance_notification(user_id: str, message: str) -> Dict[str, Any]:
     """
     发送系统维护通知
     """
-    title = "系统维护通知"
-    content = message
-    
-    return create_notification(
-        user_id=user_id,
-        title=title,
-        content=content,
-        notification_type="info",
-        sender_role="system"
-    )
+    return _emit(user_id, "system_maintenance", message=message)
 
 def send_payout_paid_notification(user_id: str, amount_cents: int, remark: str = "") -> Dict[str, Any]:
     """
     发送提现到账通知
     """
-    amount_yuan = amount_cents / 100
-    title = "提现已到账"
-    content = f"您的提现申请已处理完成，金额：¥{amount_yuan:.2f}"
-    if remark:
-        content += f"，备注：{remark}"
-    
-    return create_notification(
-        user_id=user_id,
-        title=title,
-        content=content,
-        notification_type="success",
-        sender_role="admin"
-    )
+    return _emit(user_id, "payout_paid", amount_yuan=amount_cents / 100,
+                 remark_suffix=f"，备注：{remark}" if remark else "")
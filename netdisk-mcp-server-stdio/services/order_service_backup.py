@@ -1,58 +1,178 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-订单服务?
+订单服务层
 包含订单创建、支付处理、钱包管理等功能
 """
 
-import sqlite3
-import secrets
+import itertools
+import os
 import time
-from typing import Dict, Any, List, Optional
-from .db import init_sync_db
+from functools import lru_cache
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from .db_pool import get_pool
 from .listing_service import deliver_order
+from .side_effects import submit_side_effects
 from .wallet_service import award_seller, settle_seller
+from .risk_service import check_rate_limit, log_order_operation, log_payment_callback
+from .notify_service import (send_order_created_notification, send_payment_success_notification,
+                             send_order_delivered_notification, create_notification)
 
-def check_duplicate_purchase(buyer_id: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+# 订单号/交易号：进程内单调递增序列（以启动时刻的微秒级时间戳为起点）加进程号后缀，
+# 不再每次读时钟、调用 secrets；多进程部署时靠进程号区分
+_SEQ = itertools.count(int(time.time() * 1_000_000))
+_PID_TAG = f"{os.getpid() & 0xFFF:03x}"
+
+def _next_serial() -> str:
+    return f"{next(_SEQ)}{_PID_TAG}"
+
+# 热路径 SQL：模块级常量，同一连接上命中 sqlite3 语句缓存；
+# IN (?, ...) 列表按参数个数缓存模板，同样长度的请求复用同一条语句文本
+_SQL_INSERT_ORDER = '''
+INSERT INTO orders (order_no, buyer_id, seller_id, total_amount_cents,
+                    platform_fee_cents, seller_amount_cents, status, remark)
+VALUES (?, ?, ?, ?, ?, ?, 'pending', ?)
+'''
+
+_SQL_INSERT_ORDER_ITEM = '''
+INSERT INTO order_items (order_id, listing_id, price_cents, quantity)
+VALUES (?, ?, ?, ?)
+'''
+
+# 支付记录连同订单的卖家、卖家应得金额与买家一次取出，省去回调中的二次查询
+_SQL_PENDING_PAYMENT = '''
+SELECT p.id, p.order_id, p.amount_cents, o.seller_id, o.seller_amount_cents, o.buyer_id
+FROM order_payments p
+LEFT JOIN orders o ON o.id = p.order_id
+WHERE p.transaction_id = ? AND p.status = 'pending'
+'''
+
+_SQL_MARK_PAYMENT_SUCCESS = '''
+UPDATE order_payments
+SET status = 'success', paid_at = ?
+WHERE id = ?
+'''
+
+# 支付结果与（交付成功时的）完成状态一次写入
+_SQL_MARK_ORDER_PAID = '''
+UPDATE orders
+SET status = ?, payment_status = 'success', paid_at = ?, completed_at = ?
+WHERE id = ?
+'''
+
+_SQL_MARK_PAYMENT_FAILED = '''
+UPDATE order_payments
+SET status = 'failed', payload = ?
+WHERE id = ?
+'''
+
+_SQL_INSERT_PAYMENT = '''
+INSERT INTO order_payments (order_id, provider, transaction_id, amount_cents, status)
+VALUES (?, ?, ?, ?, 'pending')
+'''
+
+# 单商品（最常见）走固定语句：等值条件，免去占位符拼接与参数列表拼接
+_SQL_DUPLICATE_PURCHASE_ONE = '''
+SELECT DISTINCT up.listing_id, l.title
+FROM user_purchases up
+LEFT JOIN listings l ON up.listing_id = l.id
+WHERE up.buyer_id = ? AND up.listing_id = ?
+'''
+
+_SQL_ORDER_LISTING_ONE = '''
+SELECT l.id, l.seller_id, l.price_cents, l.platform_split, l.seller_split, l.title,
+       EXISTS (
+           SELECT 1 FROM user_purchases up
+           WHERE up.buyer_id = ? AND up.listing_id = l.id
+       ) AS bought
+FROM listings l
+WHERE l.id = ? AND l.status = 'live'
+'''
+
+# 只关心是否买过时：命中 (buyer_id, listing_id) 索引后 LIMIT 1 即停，不取标题
+_SQL_HAS_PURCHASE_ONE = '''
+SELECT 1 FROM user_purchases WHERE buyer_id = ? AND listing_id = ? LIMIT 1
+'''
+
+@lru_cache(maxsize=64)
+def _sql_has_purchase(count: int) -> str:
+    return f'''
+SELECT 1 FROM user_purchases
+WHERE buyer_id = ? AND listing_id IN ({",".join("?" * count)})
+LIMIT 1
+'''
+
+@lru_cache(maxsize=64)
+def _sql_duplicate_purchase(count: int) -> str:
+    return f'''
+SELECT DISTINCT up.listing_id, l.title
+FROM user_purchases up
+LEFT JOIN listings l ON up.listing_id = l.id
+WHERE up.buyer_id = ? AND up.listing_id IN ({",".join("?" * count)})
+'''
+
+# 在售条件下推到 SQL，并以 EXISTS 子查询带出是否已购买
+@lru_cache(maxsize=64)
+def _sql_order_listings(count: int) -> str:
+    return f'''
+SELECT l.id, l.seller_id, l.price_cents, l.platform_split, l.seller_split, l.title,
+       EXISTS (
+           SELECT 1 FROM user_purchases up
+           WHERE up.buyer_id = ? AND up.listing_id = l.id
+       ) AS bought
+FROM listings l
+WHERE l.id IN ({",".join("?" * count)}) AND l.status = 'live'
+'''
+
+@lru_cache(maxsize=64)
+def _sql_listing_statuses(count: int) -> str:
+    return f'''
+SELECT id, status FROM listings WHERE id IN ({",".join("?" * count)})
+'''
+
+def check_duplicate_purchase(buyer_id: str, items: List[Dict[str, Any]],
+                             return_details: bool = True) -> Dict[str, Any]:
     """
-    检查重复购?
+    检查重复购买
+    return_details=False 时只返回 has_duplicate，不查询重复商品的标题
     """
     if not buyer_id or not items:
         return {"has_duplicate": False}
     
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        listing_ids = [item["listing_id"] for item in items]
-        placeholders = ",".join(["?" for _ in listing_ids])
-        
-        # 查询用户已购买的商品
-        cursor.execute(f'''
-            SELECT DISTINCT up.listing_id, l.title
-            FROM user_purchases up
-            LEFT JOIN listings l ON up.listing_id = l.id
-            WHERE up.buyer_id = ? AND up.listing_id IN ({placeholders})
-        ''', [buyer_id] + listing_ids)
-        
-        purchased_items = cursor.fetchall()
-        
-        if purchased_items:
-            duplicate_items = [item[1] or f"商品ID:{item[0]}" for item in purchased_items]
-            return {
-                "has_duplicate": True,
-                "duplicate_items": duplicate_items,
-                "duplicate_count": len(duplicate_items)
-            }
+        with get_pool().reader() as conn:
+            cursor = conn.cursor()
+            
+            if not return_details:
+                if len(items) == 1:
+                    cursor.execute(_SQL_HAS_PURCHASE_ONE, (buyer_id, items[0]["listing_id"]))
+                else:
+                    listing_ids = [item["listing_id"] for item in items]
+                    cursor.execute(_sql_has_purchase(len(listing_ids)), [buyer_id] + listing_ids)
+                return {"has_duplicate": cursor.fetchone() is not None}
+            
+            # 查询用户已购买的商品
+            if len(items) == 1:
+                cursor.execute(_SQL_DUPLICATE_PURCHASE_ONE, (buyer_id, items[0]["listing_id"]))
+            else:
+                listing_ids = [item["listing_id"] for item in items]
+                cursor.execute(_sql_duplicate_purchase(len(listing_ids)), [buyer_id] + listing_ids)
         
-        return {"has_duplicate": False}
+            purchased_items = cursor.fetchall()
+        
+            if purchased_items:
+                duplicate_items = [item[1] or f"商品ID:{item[0]}" for item in purchased_items]
+                return {
+                    "has_duplicate": True,
+                    "duplicate_items": duplicate_items,
+                    "duplicate_count": len(duplicate_items)
+                }
+        
+            return {"has_duplicate": False}
         
     except Exception as e:
-        print(f"检查重复购买失? {e}")
+        print(f"检查重复购买失败: {e}")
         return {"has_duplicate": False}
-    finally:
-        conn.close()
 
 def create_order(buyer_id: str, items: List[Dict[str, Any]], remark: Optional[str] = "") -> Dict[str, Any]:
     """
@@ -61,110 +181,82 @@ def create_order(buyer_id: str, items: List[Dict[str, Any]], remark: Optional[st
     if not buyer_id or not items:
         return {"status": "error", "message": "missing buyer_id or items"}
     
-    # 导入风控服务
-    from .risk_service import check_rate_limit, log_order_operation
-    
-    # 检查频?
+    # 检查频控
     rate_limit_result = check_rate_limit(buyer_id, 'create_order')
     if not rate_limit_result.get('allowed', False):
         return {"status": "error", "message": rate_limit_result.get('message', '操作过于频繁')}
     
-    # 检查重复购买（可选功能）
-    duplicate_check = check_duplicate_purchase(buyer_id, items)
-    if duplicate_check.get('has_duplicate'):
-        return {
-            "status": "warning", 
-            "message": f"您已购买过以下商? {', '.join(duplicate_check.get('duplicate_items', []))}，是否继续？",
-            "duplicate_items": duplicate_check.get('duplicate_items', [])
-        }
-    
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        conn.execute('BEGIN TRANSACTION')
-        
-        # 生成唯一订单?
-        order_no = f"ORD{int(time.time() * 1000)}{secrets.randbelow(1000):03d}"
-        
-        # 查询所有商品信息并验证
-        listing_ids = [item["listing_id"] for item in items]
-        placeholders = ",".join(["?" for _ in listing_ids])
-        
-        cursor.execute(f'''
-            SELECT id, seller_id, price_cents, platform_split, seller_split, status
-            FROM listings
-            WHERE id IN ({placeholders})
-        ''', listing_ids)
-        
-        listings_data = {row[0]: row for row in cursor.fetchall()}
-        
-        # 检查所有商品是否存在且可购?
-        for listing_id in listing_ids:
-            if listing_id not in listings_data:
-                return {"status": "error", "message": f"listing {listing_id} not found"}
-            
-            listing_data = listings_data[listing_id]
-            if listing_data[5] != "live":  # status
-                return {"status": "error", "message": f"listing {listing_id} not available"}
-        
-        sale_id = listings_data[listing_ids[0]][1]  # 取第一个商品的卖家ID作为订单卖家
-        
-        # 计算订单总额和分?
-        total_amount = 0
-        platform_fee = 0
-        seller_amount = 0
-        
-        # 插入订单
-        cursor.execute('''
-            INSERT INTO orders (order_no, buyer_id, seller_id, total_amount_cents, 
-                              platform_fee_cents, seller_amount_cents, status, remark)
-            VALUES (?, ?, ?, ?, ?, ?, 'pending', ?)
-        ''', (order_no, buyer_id, sale_id, total_amount, platform_fee, seller_amount, remark))
-        
-        order_id = cursor.lastrowid
-        
-        # 计算各个商品的分成并插入订单?
-        order_items_data = []
-        for item in items:
-            listing_id = item["listing_id"]
-            quantity = item.get("quantity", 1)
-            listing_data = listings_data[listing_id]
-            
-            price_cents = listing_data[2]
-            platform_split = listing_data[3]
-            seller_split = listing_data[4]
-            
-            item_amount = price_cents * quantity
-            item_platform_fee = int(item_amount * platform_split)
-            item_seller_amount = int(item_amount * seller_split)
-            
-            cursor.execute('''
-                INSERT INTO order_items (order_id, listing_id, price_cents, quantity)
-                VALUES (?, ?, ?, ?)
-            ''', (order_id, listing_id, item_amount, quantity))
-            
-            order_items_data.append({
-                "listing_id": listing_id,
-                "quantity": quantity,
-                "price_cents": item_amount,
-                "platform_fee_cents": item_platform_fee,
-                "seller_amount_cents": item_seller_amount
-            })
-            
-            total_amount += item_amount
-            platform_fee += item_platform_fee
-            seller_amount += item_seller_amount
-        
-        # 更新订单总额和分?
-        cursor.execute('''
-            UPDATE orders 
-            SET total_amount_cents = ?, platform_fee_cents = ?, seller_amount_cents = ?
-            WHERE id = ?
-        ''', (total_amount, platform_fee, seller_amount, order_id))
-        
-        conn.commit()
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
+        
+            # 生成唯一订单号
+            order_no = f"ORD{_next_serial()}"
+        
+            # 查询所有商品信息并验证
+            listing_ids = [item["listing_id"] for item in items]
+        
+            # 正常路径一条查询即完成取数、重复购买检查与校验
+            if len(listing_ids) == 1:
+                cursor.execute(_SQL_ORDER_LISTING_ONE, (buyer_id, listing_ids[0]))
+            else:
+                cursor.execute(_sql_order_listings(len(listing_ids)), [buyer_id] + listing_ids)
+        
+            rows = cursor.fetchall()
+            listings_data = {row[0]: row for row in rows}
+        
+            # 检查重复购买（尚未写入任何数据，直接返回即可）
+            duplicate_items = [row[5] or f"商品ID:{row[0]}" for row in rows if row[6]]
+            if duplicate_items:
+                return {
+                    "status": "warning", 
+                    "message": f"您已购买过以下商品: {', '.join(duplicate_items)}，是否继续？",
+                    "duplicate_items": duplicate_items
+                }
+        
+            # 检查所有商品是否存在且可购买：条数不符时才补查一次，定位具体商品
+            if len(listings_data) != len(set(listing_ids)):
+                cursor.execute(_sql_listing_statuses(len(listing_ids)), listing_ids)
+                statuses = dict(cursor.fetchall())
+                for listing_id in listing_ids:
+                    if listing_id not in statuses:
+                        return {"status": "error", "message": f"listing {listing_id} not found"}
+                    if listing_id not in listings_data:
+                        return {"status": "error", "message": f"listing {listing_id} not available"}
+        
+            sale_id = listings_data[listing_ids[0]][1]  # 取第一个商品的卖家ID作为订单卖家
+        
+            # 第一遍（纯 Python）：逐项金额与分成用列表推导算出，总额交给 sum 在 C 层累加
+            quantities = [item.get("quantity", 1) for item in items]
+            listing_rows = [listings_data[item["listing_id"]] for item in items]
+            amounts = [listing_data[2] * quantity for listing_data, quantity in zip(listing_rows, quantities)]
+            platform_fees = [int(amount * listing_data[3]) for listing_data, amount in zip(listing_rows, amounts)]
+            # 卖家所得 = 金额 - 平台抽成：少一次浮点乘法与取整，且逐项保证抽成 + 所得 == 金额
+            seller_amounts = [amount - fee for amount, fee in zip(amounts, platform_fees)]
+        
+            total_amount = sum(amounts)
+            platform_fee = sum(platform_fees)
+            seller_amount = sum(seller_amounts)
+        
+            order_items_data = [
+                {
+                    "listing_id": item["listing_id"],
+                    "quantity": quantity,
+                    "price_cents": item_amount,
+                    "platform_fee_cents": item_platform_fee,
+                    "seller_amount_cents": item_seller_amount
+                }
+                for item, quantity, item_amount, item_platform_fee, item_seller_amount
+                in zip(items, quantities, amounts, platform_fees, seller_amounts)
+            ]
+        
+            # 插入订单（总额已算好，无需先插零值再回写）
+            cursor.execute(_SQL_INSERT_ORDER, (order_no, buyer_id, sale_id, total_amount, platform_fee, seller_amount, remark))
+        
+            order_id = cursor.lastrowid
+        
+            # 第二遍：订单项一次 executemany 写入，复用同一条预编译语句
+            cursor.executemany(_SQL_INSERT_ORDER_ITEM, [(order_id, d["listing_id"], d["price_cents"], d["quantity"]) for d in order_items_data])
         
         # 记录订单操作日志
         log_order_operation(order_id, 'created', {
@@ -173,8 +265,7 @@ def create_order(buyer_id: str, items: List[Dict[str, Any]], remark: Optional[st
             'items_count': len(order_items_data)
         }, buyer_id)
         
-        # 发送新订单通知给卖?
-        from .notify_service import send_order_created_notification
+        # 发送新订单通知给卖家
         send_order_created_notification(sale_id, order_id, buyer_id, total_amount)
         
         return {
@@ -194,10 +285,7 @@ def create_order(buyer_id: str, items: List[Dict[str, Any]], remark: Optional[st
         }
         
     except Exception as exc:
-        conn.rollback()
         return {"status": "error", "message": str(exc)}
-    finally:
-        conn.close()
 
 def process_payment_callback(order_id: int, provider: str, transaction_id: str, 
                            status: str, message: Optional[str] = None) -> Dict[str, Any]:
@@ -207,117 +295,89 @@ def process_payment_callback(order_id: int, provider: str, transaction_id: str,
     if status not in ["success", "failed"]:
         return {"status": "error", "message": "invalid status"}
     
-    # 导入风控服务
-    from .risk_service import log_payment_callback, log_order_operation
-    
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    # 事务提交后才执行的通知任务：(函数, 位置参数, 关键字参数)
+    after_commit: List[Tuple[Callable[..., Any], tuple, Dict[str, Any]]] = []
     
     try:
-        conn.execute('BEGIN TRANSACTION')
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
         
-        # 检查支付记?
-        cursor.execute('''
-            SELECT id, order_id, amount_cents FROM order_payments
-            WHERE transaction_id = ? AND status = 'pending'
-        ''', (transaction_id,))
+            # 检查支付记录
+            cursor.execute(_SQL_PENDING_PAYMENT, (transaction_id,))
         
-        payment_row = cursor.fetchone()
-        if not payment_row:
-            return {"status": "error", "message": "payment not found or already processed"}
+            payment_row = cursor.fetchone()
+            if not payment_row:
+                return {"status": "error", "message": "payment not found or already processed"}
         
-        payment_id = payment_row[0]
-        actual_order_id = payment_row[1]
+            # 联表已带出卖家、应得金额与买家，后续直接使用，不再回查订单
+            payment_id, actual_order_id, amount_cents, seller_id, seller_amount, buyer_id = payment_row
         
-        if actual_order_id != order_id:
-            return {"status": "error", "message": "order_id mismatch"}
+            if actual_order_id != order_id:
+                return {"status": "error", "message": "order_id mismatch"}
         
-        now = time.time()
+            now = time.time()
         
-        if status == "success":
-            # 更新支付记录
-            cursor.execute('''
-                UPDATE order_payments 
-                SET status = 'success', paid_at = ?
-                WHERE id = ?
-            ''', (now, payment_id))
+            if status == "success":
+                # 更新支付记录
+                cursor.execute(_SQL_MARK_PAYMENT_SUCCESS, (now, payment_id))
             
-            # 更新订单状?
-            cursor.execute('''
-                UPDATE orders 
-                SET status = 'paid', payment_status = 'success', paid_at = ?
-                WHERE id = ?
-            ''', (now, order_id))
+                # 更新卖家钱包（加到待结算）
+                if seller_id is not None:
+                    # 调用钱包服务奖励卖家：复用当前写连接，在同一 IMMEDIATE 事务内执行
+                    award_result = award_seller(order_id, seller_id, seller_amount, conn=conn)
+                    if award_result.get("status") != "success":
+                        print(f"奖励卖家失败: {award_result.get('message')}")
             
-            # 更新卖家钱包（加到待结算?
-            cursor.execute('''
-                SELECT seller_id, seller_amount_cents FROM orders WHERE id = ?
-            ''', (order_id,))
+                # 调用交付逻辑
+                deliver_result = deliver_order(order_id)
+                delivered = deliver_result.get("status") == "success"
             
-            seller_row = cursor.fetchone()
-            if seller_row:
-                seller_id, seller_amount = seller_row
-                
-                # 调用钱包服务奖励卖家
-                award_result = award_seller(order_id, seller_id, seller_amount)
-                if award_result.get("status") != "success":
-                    print(f"奖励卖家失败: {award_result.get('message')}")
+                # 更新订单状态：支付结果与（交付成功时的）完成状态一次 UPDATE 写入
+                cursor.execute(_SQL_MARK_ORDER_PAID, ('completed' if delivered else 'paid', now, now if delivered else None, order_id))
             
-            # 调用交付逻辑
-            deliver_result = deliver_order(order_id)
-            if deliver_result.get("status") == "success":
-                # 更新订单为已完成
-                cursor.execute('''
-                    UPDATE orders SET status = 'completed', completed_at = ?
-                    WHERE id = ?
-                ''', (now, order_id))
-                
-                # 结算卖家收益
-                if seller_row:
-                    seller_id, seller_amount = seller_row
-                    settle_result = settle_seller(order_id, seller_id)
-                    if settle_result.get("status") != "success":
-                        print(f"结算卖家收益失败: {settle_result.get('message')}")
+                if delivered:
+                    # 结算卖家收益
+                    if seller_id is not None:
+                        settle_result = settle_seller(order_id, seller_id, conn=conn)
+                        if settle_result.get("status") != "success":
+                            print(f"结算卖家收益失败: {settle_result.get('message')}")
             
-            print(f"支付成功处理: 订单 {order_id} 金额 ¥{(payment_row[2] / 100):.2f}")
+                print(f"支付成功处理: 订单 {order_id} 金额 ¥{(amount_cents / 100):.2f}")
             
-            # 发送支付成功通知给买?
-            from .notify_service import send_payment_success_notification, send_order_delivered_notification, create_notification
-            send_payment_success_notification(buyer_id, order_id, payment_row[2])
+                # 通知只登记，提交后再投递到后台线程，不占用写锁
+                # 发送支付成功通知给买家
+                after_commit.append((send_payment_success_notification, (buyer_id, order_id, amount_cents), {}))
             
-            # 发送卖家通知
-            create_notification(seller_id, "订单已支?, "收益已转入待结算，请及时处理", notification_type="success", sender_role="system")
+                # 发送卖家通知
+                after_commit.append((create_notification, (seller_id, "订单已支付", "收益已转入待结算，请及时处理"),
+                                     {"notification_type": "success", "sender_role": "system"}))
             
-            # 如果交付成功，发送交付通知
-            if deliver_result.get("status") == "success":
-                send_order_delivered_notification(buyer_id, order_id, seller_id)
+                # 如果交付成功，发送交付通知
+                if delivered:
+                    after_commit.append((send_order_delivered_notification, (buyer_id, order_id, seller_id), {}))
             
-        else:  # failed
-            # 更新支付记录
-            cursor.execute('''
-                UPDATE order_payments 
-                SET status = 'failed', payload = ?
-                WHERE id = ?
-            ''', (f"Failure reason: {message or 'Unknown'}", payment_id))
+            else:  # failed
+                # 更新支付记录
+                cursor.execute(_SQL_MARK_PAYMENT_FAILED, (f"Failure reason: {message or 'Unknown'}", payment_id))
             
-            print(f"支付失败记录: 订单 {order_id} - {message or 'Unknown'}")
-        
-        conn.commit()
+                print(f"支付失败记录: 订单 {order_id} - {message or 'Unknown'}")
         
         # 记录支付回调日志
-        log_payment_callback(order_id, provider, transaction_id, status, {
+        after_commit.append((log_payment_callback, (order_id, provider, transaction_id, status, {
             'message': message,
             'payment_id': payment_id,
-            'amount_cents': payment_row[2]
-        })
+            'amount_cents': amount_cents
+        }), {}))
         
         # 记录订单操作日志
-        log_order_operation(order_id, f'payment_{status}', {
+        after_commit.append((log_order_operation, (order_id, f'payment_{status}', {
             'provider': provider,
             'transaction_id': transaction_id,
             'message': message
-        })
+        }), {}))
+        
+        # 事务已提交：通知与日志交给后台线程，回调立即返回
+        submit_side_effects(after_commit)
         
         return {
             "status": "success",
@@ -325,30 +385,20 @@ def process_payment_callback(order_id: int, provider: str, transaction_id: str,
         }
         
     except Exception as exc:
-        conn.rollback()
         return {"status": "error", "message": str(exc)}
-    finally:
-        conn.close()
 
 def create_payment_record(order_id: int, provider: str, amount_cents: int) -> Dict[str, Any]:
     """
     创建支付记录
     """
-    transaction_id = f"TXN{int(time.time() * 1000)}{secrets.randbelow(10000):04d}"
-    
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    transaction_id = f"TXN{_next_serial()}"
     
     try:
-        cursor.execute('''
-            INSERT INTO order_payments (order_id, provider, transaction_id, amount_cents, status)
-            VALUES (?, ?, ?, ?, 'pending')
-        ''', (order_id, provider, transaction_id, amount_cents))
-        
-        payment_id = cursor.lastrowid
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
+            cursor.execute(_SQL_INSERT_PAYMENT, (order_id, provider, transaction_id, amount_cents))
         
-        conn.commit()
+            payment_id = cursor.lastrowid
         
         return {
             "status": "success",
@@ -357,7 +407,4 @@ def create_payment_record(order_id: int, provider: str, amount_cents: int) -> Di
         }
         
     except Exception as exc:
-        conn.rollback()
         return {"status": "error", "message": str(exc)}
-    finally:
-        conn.close()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+订单服务层（异步接口，对应 order_service_backup）
+与同步版本同名同参；阻塞的 SQLite 事务放到线程中执行，不占用事件循环，
+支付回调提交后的通知与日志仍由同步版本的后台线程池投递
+"""
+
+import asyncio
+from typing import Dict, Any, List, Optional
+
+from . import order_service_backup
+
+
+async def check_duplicate_purchase(buyer_id: str, items: List[Dict[str, Any]],
+                                   return_details: bool = True) -> Dict[str, Any]:
+    """
+    检查重复购买
+    """
+    return await asyncio.to_thread(order_service_backup.check_duplicate_purchase, buyer_id, items,
+                                   return_details)
+
+
+async def create_order(buyer_id: str, items: List[Dict[str, Any]],
+                       remark: Optional[str] = "") -> Dict[str, Any]:
+    """
+    创建订单
+    """
+    return await asyncio.to_thread(order_service_backup.create_order, buyer_id, items, remark)
+
+
+async def process_payment_callback(order_id: int, provider: str, transaction_id: str,
+                                   status: str, message: Optional[str] = None) -> Dict[str, Any]:
+    """
+    处理支付回调
+    """
+    return await asyncio.to_thread(order_service_backup.process_payment_callback, order_id,
+                                   provider, transaction_id, status, message)
+
+
+async def create_payment_record(order_id: int, provider: str, amount_cents: int) -> Dict[str, Any]:
+    """
+    创建支付记录
+    """
+    return await asyncio.to_thread(order_service_backup.create_payment_record, order_id,
+                                   provider, amount_cents)
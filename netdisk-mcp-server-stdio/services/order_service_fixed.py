@@ -5,14 +5,41 @@
 包含订单创建、支付处理、钱包管理等功能
 """
 
-import sqlite3
+import json
 import secrets
 import time
-from typing import Dict, Any, List, Optional
-from .db import init_sync_db
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from .db_pool import get_pool
 from .listing_service import deliver_order
+from .order_service import _json_real
+from .side_effects import submit_side_effects
 from .wallet_service import award_seller, settle_seller
 
+# 订单详情：订单项与支付记录经 json_group_array 在同一行内聚合为 JSON 数组，一次查询取回；
+# 支付记录按创建时间倒序
+_SQL_ORDER_DETAIL = f'''
+SELECT o.id, o.order_no, o.buyer_id, o.seller_id, o.total_amount_cents,
+       o.platform_fee_cents, o.seller_amount_cents, o.currency, o.status,
+       o.payment_status, o.created_at, o.updated_at, o.paid_at, o.delivered_at,
+       o.completed_at, u.display_name as buyer_name, s.display_name as seller_name,
+       (SELECT json_group_array(json_object(
+                   'id', oi.id, 'listing_id', oi.listing_id, 'price_cents', oi.price_cents,
+                   'quantity', oi.quantity, 'delivered_at', {_json_real('oi.delivered_at')},
+                   'title', l.title, 'description', l.description))
+        FROM order_items oi
+        LEFT JOIN listings l ON oi.listing_id = l.id
+        WHERE oi.order_id = o.id) AS items_json,
+       (SELECT json_group_array(json_object(
+                   'id', p.id, 'provider', p.provider, 'transaction_id', p.transaction_id,
+                   'amount_cents', p.amount_cents, 'status', p.status,
+                   'created_at', {_json_real('p.created_at')}, 'paid_at', {_json_real('p.paid_at')}))
+        FROM (SELECT * FROM order_payments WHERE order_id = o.id ORDER BY created_at DESC) p) AS payments_json
+FROM orders o
+LEFT JOIN users u ON o.buyer_id = u.user_id
+LEFT JOIN users s ON o.seller_id = s.user_id
+WHERE o.id = ?
+'''
+
 def check_duplicate_purchase(buyer_id: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     检查重复购买
@@ -20,39 +47,36 @@ def check_duplicate_purchase(buyer_id: str, items: List[Dict[str, Any]]) -> Dict
     if not buyer_id or not items:
         return {"has_duplicate": False}
     
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        listing_ids = [item["listing_id"] for item in items]
-        placeholders = ",".join(["?" for _ in listing_ids])
-        
-        # 查询用户已购买的商品
-        cursor.execute(f'''
-            SELECT DISTINCT up.listing_id, l.title
-            FROM user_purchases up
-            LEFT JOIN listings l ON up.listing_id = l.id
-            WHERE up.buyer_id = ? AND up.listing_id IN ({placeholders})
-        ''', [buyer_id] + listing_ids)
-        
-        purchased_items = cursor.fetchall()
-        
-        if purchased_items:
-            duplicate_items = [item[1] or f"商品ID:{item[0]}" for item in purchased_items]
-            return {
-                "has_duplicate": True,
-                "duplicate_items": duplicate_items,
-                "duplicate_count": len(duplicate_items)
-            }
-        
-        return {"has_duplicate": False}
-        
+        with get_pool().reader() as conn:
+            cursor = conn.cursor()
+            
+            listing_ids = [item["listing_id"] for item in items]
+            placeholders = ",".join(["?" for _ in listing_ids])
+            
+            # 查询用户已购买的商品
+            cursor.execute(f'''
+                SELECT DISTINCT up.listing_id, l.title
+                FROM user_purchases up
+                LEFT JOIN listings l ON up.listing_id = l.id
+                WHERE up.buyer_id = ? AND up.listing_id IN ({placeholders})
+            ''', [buyer_id] + listing_ids)
+            
+            purchased_items = cursor.fetchall()
+            
+            if purchased_items:
+                duplicate_items = [item[1] or f"商品ID:{item[0]}" for item in purchased_items]
+                return {
+                    "has_duplicate": True,
+                    "duplicate_items": duplicate_items,
+                    "duplicate_count": len(duplicate_items)
+                }
+            
+            return {"has_duplicate": False}
+            
     except Exception as e:
         print(f"检查重复购买失败: {e}")
         return {"has_duplicate": False}
-    finally:
-        conn.close()
 
 def create_order(buyer_id: str, items: List[Dict[str, Any]], 
                 check_duplicate: bool = True) -> Dict[str, Any]:
@@ -80,197 +104,182 @@ def create_order(buyer_id: str, items: List[Dict[str, Any]],
                 "duplicate_items": duplicate_check.get("duplicate_items", [])
             }
     
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        # 开始事务
-        cursor.execute("BEGIN TRANSACTION")
-        
-        # 生成订单号
-        order_no = f"ORD{int(time.time())}{secrets.randbelow(1000):03d}"
-        
-        # 计算总金额
-        total_amount_cents = 0
-        platform_fee_cents = 0
-        seller_amount_cents = 0
-        seller_id = None
-        
-        for item in items:
-            listing_id = item["listing_id"]
-            quantity = item.get("quantity", 1)
-            
-            # 获取商品信息
-            cursor.execute('''
-                SELECT seller_id, price_cents, platform_split, seller_split, status
-                FROM listings 
-                WHERE id = ? AND status = 'live'
-            ''', (listing_id,))
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
             
-            listing_row = cursor.fetchone()
-            if not listing_row:
-                raise Exception(f"商品 {listing_id} 不存在或已下架")
+            # 订单、订单项共用同一时间戳
+            now = time.time()
             
-            item_seller_id, price_cents, platform_split, seller_split, status = listing_row
+            # 生成订单号
+            order_no = f"ORD{int(now)}{secrets.randbelow(1000):03d}"
             
-            if seller_id is None:
-                seller_id = item_seller_id
-            elif seller_id != item_seller_id:
-                raise Exception("订单中的商品必须来自同一卖家")
+            # 一次 IN 查询取回全部在售商品，校验与金额计算在 Python 中完成
+            listing_ids = [item["listing_id"] for item in items]
+            placeholders = ",".join(["?" for _ in listing_ids])
+            cursor.execute(f'''
+                SELECT id, seller_id, price_cents, platform_split, seller_split, status
+                FROM listings 
+                WHERE id IN ({placeholders}) AND status = 'live'
+            ''', listing_ids)
+            listings = {row[0]: row for row in cursor.fetchall()}
             
-            item_total = price_cents * quantity
-            item_platform_fee = int(item_total * platform_split)
-            item_seller_amount = int(item_total * seller_split)
+            # 计算总金额
+            total_amount_cents = 0
+            platform_fee_cents = 0
+            seller_amount_cents = 0
+            seller_id = None
             
-            total_amount_cents += item_total
-            platform_fee_cents += item_platform_fee
-            seller_amount_cents += item_seller_amount
-        
-        # 创建订单
-        cursor.execute('''
-            INSERT INTO orders (order_no, buyer_id, seller_id, total_amount_cents, 
-                              platform_fee_cents, seller_amount_cents, currency, status, 
-                              payment_status, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, 'CNY', 'pending', 'pending', ?, ?)
-        ''', (order_no, buyer_id, seller_id, total_amount_cents, 
-              platform_fee_cents, seller_amount_cents, time.time(), time.time()))
-        
-        order_id = cursor.lastrowid
-        
-        # 创建订单项
-        for item in items:
-            listing_id = item["listing_id"]
-            quantity = item.get("quantity", 1)
+            for item in items:
+                listing_id = item["listing_id"]
+                quantity = item.get("quantity", 1)
+                
+                listing_row = listings.get(listing_id)
+                if not listing_row:
+                    raise Exception(f"商品 {listing_id} 不存在或已下架")
+                
+                _, item_seller_id, price_cents, platform_split, seller_split, status = listing_row
+                
+                if seller_id is None:
+                    seller_id = item_seller_id
+                elif seller_id != item_seller_id:
+                    raise Exception("订单中的商品必须来自同一卖家")
+                
+                item_total = price_cents * quantity
+                item_platform_fee = int(item_total * platform_split)
+                item_seller_amount = int(item_total * seller_split)
+                
+                total_amount_cents += item_total
+                platform_fee_cents += item_platform_fee
+                seller_amount_cents += item_seller_amount
             
+            # 创建订单（总额已算好，无需事后回写）
             cursor.execute('''
-                SELECT price_cents FROM listings WHERE id = ?
-            ''', (listing_id,))
+                INSERT INTO orders (order_no, buyer_id, seller_id, total_amount_cents, 
+                                  platform_fee_cents, seller_amount_cents, currency, status, 
+                                  payment_status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, 'CNY', 'pending', 'pending', ?, ?)
+            ''', (order_no, buyer_id, seller_id, total_amount_cents, 
+                  platform_fee_cents, seller_amount_cents, now, now))
             
-            price_cents = cursor.fetchone()[0]
+            order_id = cursor.lastrowid
             
-            cursor.execute('''
+            # 创建订单项：单价取自上面已查出的商品行，一次 executemany 写入
+            cursor.executemany('''
                 INSERT INTO order_items (order_id, listing_id, price_cents, quantity, created_at)
                 VALUES (?, ?, ?, ?, ?)
-            ''', (order_id, listing_id, price_cents, quantity, time.time()))
-        
-        # 更新订单总金额
-        cursor.execute('''
-            UPDATE orders 
-            SET total_amount_cents = ?, platform_fee_cents = ?, seller_amount_cents = ?
-            WHERE id = ?
-        ''', (total_amount_cents, platform_fee_cents, seller_amount_cents, order_id))
-        
-        # 提交事务
-        conn.commit()
-        
-        return {
-            "status": "success",
-            "order_id": order_id,
-            "order_no": order_no,
-            "total_amount_cents": total_amount_cents,
-            "platform_fee_cents": platform_fee_cents,
-            "seller_amount_cents": seller_amount_cents
-        }
-        
+            ''', [(order_id, item["listing_id"], listings[item["listing_id"]][2], item.get("quantity", 1), now)
+                  for item in items])
+            
+            return {
+                "status": "success",
+                "order_id": order_id,
+                "order_no": order_no,
+                "total_amount_cents": total_amount_cents,
+                "platform_fee_cents": platform_fee_cents,
+                "seller_amount_cents": seller_amount_cents
+            }
+            
     except Exception as e:
-        conn.rollback()
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
 
 def process_payment_callback(transaction_id: str, status: str, 
                            amount_cents: int, message: str = None) -> Dict[str, Any]:
     """
     处理支付回调
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    # 事务提交后才执行的通知任务：(函数, 位置参数, 关键字参数)
+    after_commit: List[Tuple[Callable[..., Any], tuple, Dict[str, Any]]] = []
     
     try:
-        # 查找对应的支付记录
-        cursor.execute('''
-            SELECT id, order_id, amount_cents, status
-            FROM order_payments 
-            WHERE transaction_id = ? AND status = 'pending'
-        ''', (transaction_id,))
-        
-        payment_row = cursor.fetchone()
-        if not payment_row:
-            return {"status": "error", "message": "支付记录不存在"}
-        
-        payment_id, order_id, expected_amount, current_status = payment_row
-        
-        # 验证金额
-        if amount_cents != expected_amount:
-            return {"status": "error", "message": f"金额不匹配: 期望 {expected_amount}, 实际 {amount_cents}"}
-        
-        if status == "success":
-            # 更新支付记录
-            cursor.execute('''
-                UPDATE order_payments 
-                SET status = 'success', paid_at = ?
-                WHERE id = ?
-            ''', (time.time(), payment_id))
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
             
-            # 更新订单状态
+            # 查找对应的支付记录
             cursor.execute('''
-                UPDATE orders 
-                SET status = 'paid', payment_status = 'success', paid_at = ?
-                WHERE id = ?
-            ''', (time.time(), order_id))
+                SELECT id, order_id, amount_cents, status
+                FROM order_payments 
+                WHERE transaction_id = ? AND status = 'pending'
+            ''', (transaction_id,))
             
-            # 获取订单信息
-            cursor.execute('''
-                SELECT seller_id, seller_amount_cents FROM orders WHERE id = ?
-            ''', (order_id,))
+            payment_row = cursor.fetchone()
+            if not payment_row:
+                return {"status": "error", "message": "支付记录不存在"}
             
-            seller_id, seller_amount_cents = cursor.fetchone()
+            payment_id, order_id, expected_amount, current_status = payment_row
             
-            # 更新卖家钱包（加到待结算）
-            award_result = award_seller(order_id, seller_id, seller_amount_cents)
-            if award_result.get("status") != "success":
-                print(f"结算卖家收益失败: {award_result.get('message')}")
+            # 验证金额
+            if amount_cents != expected_amount:
+                return {"status": "error", "message": f"金额不匹配: 期望 {expected_amount}, 实际 {amount_cents}"}
             
-            # 交付订单
-            deliver_result = deliver_order(order_id)
-            if deliver_result.get("status") == "success":
-                # 更新订单状态为已完成
+            if status == "success":
+                # 更新支付记录
                 cursor.execute('''
-                    UPDATE orders SET status = 'completed', completed_at = ?
+                    UPDATE order_payments 
+                    SET status = 'success', paid_at = ?
+                    WHERE id = ?
+                ''', (time.time(), payment_id))
+                
+                # 更新订单状态
+                cursor.execute('''
+                    UPDATE orders 
+                    SET status = 'paid', payment_status = 'success', paid_at = ?
                     WHERE id = ?
                 ''', (time.time(), order_id))
-            
-            print(f"支付成功处理: 订单 {order_id} 金额 ¥{(payment_row[2] / 100):.2f}")
-            
-            # 发送支付成功通知给买家
-            from .notify_service import send_payment_success_notification, send_order_delivered_notification, create_notification
-            send_payment_success_notification(buyer_id, order_id, payment_row[2])
-            
-            # 发送卖家通知
-            create_notification(seller_id, "订单已支付", "收益已转入待结算，请及时处理", notification_type="success", sender_role="system")
-            
-            # 如果交付成功，发送交付通知
-            if deliver_result.get("status") == "success":
-                send_order_delivered_notification(buyer_id, order_id, seller_id)
-            
-        else:  # failed
-            # 更新支付记录
-            cursor.execute('''
-                UPDATE order_payments 
-                SET status = 'failed', payload = ?
-                WHERE id = ?
-            ''', (f"Failure reason: {message or 'Unknown'}", payment_id))
-            
-            # 更新订单状态
-            cursor.execute('''
-                UPDATE orders 
-                SET status = 'failed', payment_status = 'failed'
-                WHERE id = ?
-            ''', (order_id,))
+                
+                # 获取订单信息（买家用于提交后的通知）
+                cursor.execute('''
+                    SELECT seller_id, seller_amount_cents, buyer_id FROM orders WHERE id = ?
+                ''', (order_id,))
+                
+                seller_id, seller_amount_cents, buyer_id = cursor.fetchone()
+                
+                # 更新卖家钱包（加到待结算）：复用当前写连接，不另开连接争抢写锁
+                award_result = award_seller(order_id, seller_id, seller_amount_cents, conn=conn)
+                if award_result.get("status") != "success":
+                    print(f"结算卖家收益失败: {award_result.get('message')}")
+                
+                # 交付订单
+                deliver_result = deliver_order(order_id)
+                if deliver_result.get("status") == "success":
+                    # 更新订单状态为已完成
+                    cursor.execute('''
+                        UPDATE orders SET status = 'completed', completed_at = ?
+                        WHERE id = ?
+                    ''', (time.time(), order_id))
+                
+                print(f"支付成功处理: 订单 {order_id} 金额 ¥{(payment_row[2] / 100):.2f}")
+                
+                # 通知只登记，提交后再投递到后台线程，不占用写锁
+                from .notify_service import send_payment_success_notification, send_order_delivered_notification, create_notification
+                # 发送支付成功通知给买家
+                after_commit.append((send_payment_success_notification, (buyer_id, order_id, payment_row[2]), {}))
+                
+                # 发送卖家通知
+                after_commit.append((create_notification, (seller_id, "订单已支付", "收益已转入待结算，请及时处理"),
+                                     {"notification_type": "success", "sender_role": "system"}))
+                
+                # 如果交付成功，发送交付通知
+                if deliver_result.get("status") == "success":
+                    after_commit.append((send_order_delivered_notification, (buyer_id, order_id, seller_id), {}))
+                
+            else:  # failed
+                # 更新支付记录
+                cursor.execute('''
+                    UPDATE order_payments 
+                    SET status = 'failed', payload = ?
+                    WHERE id = ?
+                ''', (f"Failure reason: {message or 'Unknown'}", payment_id))
+                
+                # 更新订单状态
+                cursor.execute('''
+                    UPDATE orders 
+                    SET status = 'failed', payment_status = 'failed'
+                    WHERE id = ?
+                ''', (order_id,))
         
-        conn.commit()
+        # 事务已提交：通知交给后台线程，回调立即返回
+        submit_side_effects(after_commit)
         
         return {
             "status": "success",
@@ -279,206 +288,150 @@ def process_payment_callback(transaction_id: str, status: str,
         }
         
     except Exception as e:
-        conn.rollback()
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
 
 def create_payment_record(order_id: int, provider: str, transaction_id: str, 
                          amount_cents: int) -> Dict[str, Any]:
     """
     创建支付记录
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute('''
-            INSERT INTO order_payments (order_id, provider, transaction_id, amount_cents, status, created_at)
-            VALUES (?, ?, ?, ?, 'pending', ?)
-        ''', (order_id, provider, transaction_id, amount_cents, time.time()))
-        
-        payment_id = cursor.lastrowid
-        conn.commit()
-        
-        return {
-            "status": "success",
-            "payment_id": payment_id,
-            "message": "支付记录创建成功"
-        }
-        
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO order_payments (order_id, provider, transaction_id, amount_cents, status, created_at)
+                VALUES (?, ?, ?, ?, 'pending', ?)
+            ''', (order_id, provider, transaction_id, amount_cents, time.time()))
+            
+            payment_id = cursor.lastrowid
+            
+            return {
+                "status": "success",
+                "payment_id": payment_id,
+                "message": "支付记录创建成功"
+            }
+            
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
 
 def get_order_detail(order_id: int) -> Dict[str, Any]:
     """
     获取订单详情
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        # 获取订单基本信息
-        cursor.execute('''
-            SELECT o.id, o.order_no, o.buyer_id, o.seller_id, o.total_amount_cents,
-                   o.platform_fee_cents, o.seller_amount_cents, o.currency, o.status,
-                   o.payment_status, o.created_at, o.updated_at, o.paid_at, o.delivered_at,
-                   o.completed_at, u.display_name as buyer_name, s.display_name as seller_name
-            FROM orders o
-            LEFT JOIN users u ON o.buyer_id = u.user_id
-            LEFT JOIN users s ON o.seller_id = s.user_id
-            WHERE o.id = ?
-        ''', (order_id,))
-        
-        order_row = cursor.fetchone()
-        if not order_row:
-            return {"status": "error", "message": "订单不存在"}
-        
-        # 获取订单项
-        cursor.execute('''
-            SELECT oi.id, oi.listing_id, oi.price_cents, oi.quantity, oi.delivered_at,
-                   l.title, l.description
-            FROM order_items oi
-            LEFT JOIN listings l ON oi.listing_id = l.id
-            WHERE oi.order_id = ?
-        ''', (order_id,))
-        
-        items = []
-        for row in cursor.fetchall():
-            items.append({
-                "id": row[0],
-                "listing_id": row[1],
-                "price_cents": row[2],
-                "quantity": row[3],
-                "delivered_at": row[4],
-                "title": row[5],
-                "description": row[6]
-            })
-        
-        # 获取支付记录
-        cursor.execute('''
-            SELECT id, provider, transaction_id, amount_cents, status, created_at, paid_at
-            FROM order_payments 
-            WHERE order_id = ?
-            ORDER BY created_at DESC
-        ''', (order_id,))
-        
-        payments = []
-        for row in cursor.fetchall():
-            payments.append({
-                "id": row[0],
-                "provider": row[1],
-                "transaction_id": row[2],
-                "amount_cents": row[3],
-                "status": row[4],
-                "created_at": row[5],
-                "paid_at": row[6]
-            })
-        
-        return {
-            "status": "success",
-            "order": {
-                "id": order_row[0],
-                "order_no": order_row[1],
-                "buyer_id": order_row[2],
-                "seller_id": order_row[3],
-                "total_amount_cents": order_row[4],
-                "platform_fee_cents": order_row[5],
-                "seller_amount_cents": order_row[6],
-                "currency": order_row[7],
-                "status": order_row[8],
-                "payment_status": order_row[9],
-                "created_at": order_row[10],
-                "updated_at": order_row[11],
-                "paid_at": order_row[12],
-                "delivered_at": order_row[13],
-                "completed_at": order_row[14],
-                "buyer_name": order_row[15],
-                "seller_name": order_row[16],
-                "items": items,
-                "payments": payments
+        with get_pool().reader() as conn:
+            cursor = conn.cursor()
+            
+            # 订单基本信息连同订单项、支付记录（JSON 数组列）一次取回
+            cursor.execute(_SQL_ORDER_DETAIL, (order_id,))
+            
+            order_row = cursor.fetchone()
+            if not order_row:
+                return {"status": "error", "message": "订单不存在"}
+            
+            return {
+                "status": "success",
+                "order": {
+                    "id": order_row[0],
+                    "order_no": order_row[1],
+                    "buyer_id": order_row[2],
+                    "seller_id": order_row[3],
+                    "total_amount_cents": order_row[4],
+                    "platform_fee_cents": order_row[5],
+                    "seller_amount_cents": order_row[6],
+                    "currency": order_row[7],
+                    "status": order_row[8],
+                    "payment_status": order_row[9],
+                    "created_at": order_row[10],
+                    "updated_at": order_row[11],
+                    "paid_at": order_row[12],
+                    "delivered_at": order_row[13],
+                    "completed_at": order_row[14],
+                    "buyer_name": order_row[15],
+                    "seller_name": order_row[16],
+                    "items": json.loads(order_row[17]),
+                    "payments": json.loads(order_row[18])
+                }
             }
-        }
-        
+            
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
 
 def get_user_orders(user_id: str, role: str = "buyer", 
                    status: Optional[str] = None, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
     """
     获取用户订单列表
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        # 构建查询条件
-        if role == "buyer":
-            where_clause = "WHERE o.buyer_id = ?"
-            params = [user_id]
-        elif role == "seller":
-            where_clause = "WHERE o.seller_id = ?"
-            params = [user_id]
-        else:
-            return {"status": "error", "message": "无效的角色类型"}
-        
-        if status:
-            where_clause += " AND o.status = ?"
-            params.append(status)
-        
-        # 获取订单列表
-        cursor.execute(f'''
-            SELECT o.id, o.order_no, o.buyer_id, o.seller_id, o.total_amount_cents,
-                   o.currency, o.status, o.payment_status, o.created_at, o.paid_at,
-                   u.display_name as buyer_name, s.display_name as seller_name
-            FROM orders o
-            LEFT JOIN users u ON o.buyer_id = u.user_id
-            LEFT JOIN users s ON o.seller_id = s.user_id
-            {where_clause}
-            ORDER BY o.created_at DESC
-            LIMIT ? OFFSET ?
-        ''', (*params, limit, offset))
-        
-        orders = []
-        for row in cursor.fetchall():
-            orders.append({
-                "id": row[0],
-                "order_no": row[1],
-                "buyer_id": row[2],
-                "seller_id": row[3],
-                "total_amount_cents": row[4],
-                "currency": row[5],
-                "status": row[6],
-                "payment_status": row[7],
-                "created_at": row[8],
-                "paid_at": row[9],
-                "buyer_name": row[10],
-                "seller_name": row[11]
-            })
-        
-        # 获取总数
-        cursor.execute(f'''
-            SELECT COUNT(*) FROM orders o {where_clause}
-        ''', params)
-        
-        total = cursor.fetchone()[0]
-        
-        return {
-            "status": "success",
-            "orders": orders,
-            "total": total,
-            "limit": limit,
-            "offset": offset
-        }
-        
+        with get_pool().reader() as conn:
+            cursor = conn.cursor()
+            
+            # 构建查询条件
+            if role == "buyer":
+                where_clause = "WHERE o.buyer_id = ?"
+                params = [user_id]
+            elif role == "seller":
+                where_clause = "WHERE o.seller_id = ?"
+                params = [user_id]
+            else:
+                return {"status": "error", "message": "无效的角色类型"}
+            
+            if status:
+                where_clause += " AND o.status = ?"
+                params.append(status)
+            
+            # 获取订单列表
+            cursor.execute(f'''
+                SELECT o.id, o.order_no, o.buyer_id, o.seller_id, o.total_amount_cents,
+                       o.currency, o.status, o.payment_status, o.created_at, o.paid_at,
+                       u.display_name as buyer_name, s.display_name as seller_name,
+                       COUNT(*) OVER () AS _total
+                FROM orders o
+                LEFT JOIN users u ON o.buyer_id = u.user_id
+                LEFT JOIN users s ON o.seller_id = s.user_id
+                {where_clause}
+                ORDER BY o.created_at DESC
+                LIMIT ? OFFSET ?
+            ''', (*params, limit, offset))
+            
+            rows = cursor.fetchall()
+            
+            orders = []
+            for row in rows:
+                orders.append({
+                    "id": row[0],
+                    "order_no": row[1],
+                    "buyer_id": row[2],
+                    "seller_id": row[3],
+                    "total_amount_cents": row[4],
+                    "currency": row[5],
+                    "status": row[6],
+                    "payment_status": row[7],
+                    "created_at": row[8],
+                    "paid_at": row[9],
+                    "buyer_name": row[10],
+                    "seller_name": row[11]
+                })
+            
+            # 总数随列表一并返回（窗口函数）；仅当偏移越过末页、本页为空时才单独计数
+            if rows:
+                total = rows[0][12]
+            elif offset > 0:
+                cursor.execute(f'''
+                    SELECT COUNT(*) FROM orders o {where_clause}
+                ''', params)
+                total = cursor.fetchone()[0]
+            else:
+                total = 0
+            
+            return {
+                "status": "success",
+                "orders": orders,
+                "total": total,
+                "limit": limit,
+                "offset": offset
+            }
+            
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        conn.close()
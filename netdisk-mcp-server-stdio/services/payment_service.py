@@ -5,19 +5,19 @@
 包含支付配置管理、支付账户绑定等功能
 """
 
-import sqlite3
 import json
 import base64
 import os
+import threading
 import time
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
 from urllib.parse import urlencode, quote_plus
-from datetime import datetime
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
 from cryptography.fernet import Fernet
-from .db import init_sync_db
+from .db_pool import get_pool
 
 # 加密密钥，从环境变量获取
 _raw_key = os.getenv('PAYMENT_ENCRYPTION_KEY')
@@ -28,14 +28,15 @@ if not _raw_key and _allow_tmp:
     _raw_key = Fernet.generate_key().decode()
     print("警告: 使用临时加密密钥，生产环境请设置 PAYMENT_ENCRYPTION_KEY")
 ENCRYPTION_KEY = _raw_key.encode() if isinstance(_raw_key, str) else _raw_key
+# Fernet 实例无状态、线程安全，导入时构造一次，加解密不再逐次解析密钥
+_FERNET = Fernet(ENCRYPTION_KEY)
 
 def encrypt_sensitive_data(data: str) -> str:
     """加密敏感数据"""
     if not data:
         return ""
     try:
-        f = Fernet(ENCRYPTION_KEY)
-        encrypted_data = f.encrypt(data.encode())
+        encrypted_data = _FERNET.encrypt(data.encode())
         return base64.b64encode(encrypted_data).decode()
     except Exception as e:
         print(f"加密失败: {e}")
@@ -46,15 +47,38 @@ def decrypt_sensitive_data(encrypted_data: str) -> str:
     if not encrypted_data:
         return ""
     try:
-        f = Fernet(ENCRYPTION_KEY)
         decoded_data = base64.b64decode(encrypted_data.encode())
-        decrypted_data = f.decrypt(decoded_data)
+        decrypted_data = _FERNET.decrypt(decoded_data)
         return decrypted_data.decode()
     except Exception as e:
         print(f"解密失败: {e}")
         return encrypted_data
 
+# 平台支付配置的进程内缓存：provider -> (缓存过期时间, 配置)
+# 下单/轮询查询每次都要取私钥，缓存后免去读文件/查库与 Fernet 解密；保存配置时失效
+PAYMENT_CONFIG_CACHE_TTL = 60
+_PAYMENT_CONFIG_CACHE: Dict[str, Tuple[float, Dict[str, str]]] = {}
+_PAYMENT_CONFIG_CACHE_LOCK = threading.Lock()
+
 def load_platform_payment_config(provider: str) -> Optional[Dict[str, str]]:
+    """加载平台支付配置（带 TTL 缓存，未配置的结果不缓存）"""
+    now = time.time()
+    with _PAYMENT_CONFIG_CACHE_LOCK:
+        cached = _PAYMENT_CONFIG_CACHE.get(provider)
+    if cached and cached[0] > now:
+        return dict(cached[1])
+    config = _read_platform_payment_config(provider)
+    if config:
+        with _PAYMENT_CONFIG_CACHE_LOCK:
+            _PAYMENT_CONFIG_CACHE[provider] = (now + PAYMENT_CONFIG_CACHE_TTL, config)
+        return dict(config)
+    return config
+
+def _invalidate_platform_payment_config(provider: str) -> None:
+    with _PAYMENT_CONFIG_CACHE_LOCK:
+        _PAYMENT_CONFIG_CACHE.pop(provider, None)
+
+def _read_platform_payment_config(provider: str) -> Optional[Dict[str, str]]:
     """加载平台支付配置
 
     优先从环境变量读取（路径或Base64），否则读取数据库加密存储。
@@ -86,33 +110,30 @@ def load_platform_payment_config(provider: str) -> Optional[Dict[str, str]]:
                 return {"public_key": pub, "private_key": priv, "status": "active", "source": "env:b64"}
             except Exception as e:
                 print(f"解码支付宝密钥Base64失败: {e}")
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute('''
-            SELECT public_key, private_key, status
-            FROM platform_payment_configs
-            WHERE provider = ? AND status = 'active'
-        ''', (provider,))
-        
-        row = cursor.fetchone()
-        if not row:
-            return None
-        
-        public_key, private_key, status = row
-        
-        return {
-            "public_key": decrypt_sensitive_data(public_key),
-            "private_key": decrypt_sensitive_data(private_key),
-            "status": status
-        }
+        with get_pool().reader() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT public_key, private_key, status
+                FROM platform_payment_configs
+                WHERE provider = ? AND status = 'active'
+            ''', (provider,))
+            
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            public_key, private_key, status = row
+            
+            return {
+                "public_key": decrypt_sensitive_data(public_key),
+                "private_key": decrypt_sensitive_data(private_key),
+                "status": status
+            }
     except Exception as e:
         print(f"加载平台支付配置失败: {e}")
         return None
-    finally:
-        conn.close()
 
 def save_platform_payment_config(provider: str, public_key: str, private_key: str, admin_id: str = "system") -> Dict[str, Any]:
     """保存平台支付配置"""
@@ -124,48 +145,60 @@ def save_platform_payment_config(provider: str, public_key: str, private_key: st
     if not rate_limit_result.get('allowed', False):
         return {"status": "error", "message": rate_limit_result.get('message', '操作过于频繁')}
     
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
     try:
-        # 检查是否已存在
-        cursor.execute('SELECT id FROM platform_payment_configs WHERE provider = ?', (provider,))
-        existing = cursor.fetchone()
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
+            
+            # 检查是否已存在
+            cursor.execute('SELECT id FROM platform_payment_configs WHERE provider = ?', (provider,))
+            existing = cursor.fetchone()
+            
+            if existing:
+                # 更新现有配置
+                cursor.execute('''
+                    UPDATE platform_payment_configs 
+                    SET public_key = ?, private_key = ?, updated_at = ?, status = 'active'
+                    WHERE provider = ?
+                ''', (
+                    encrypt_sensitive_data(public_key),
+                    encrypt_sensitive_data(private_key),
+                    time.time(),
+                    provider
+                ))
+                message = "payment config updated"
+            else:
+                # 创建新配置
+                cursor.execute('''
+                    INSERT INTO platform_payment_configs (provider, public_key, private_key, status)
+                    VALUES (?, ?, ?, 'active')
+                ''', (
+                    provider,
+                    encrypt_sensitive_data(public_key),
+                    encrypt_sensitive_data(private_key)
+                ))
+                message = "payment config created"
         
-        if existing:
-            # 更新现有配置
-            cursor.execute('''
+        _invalidate_platform_payment_config(provider)
+        return {"status": "success", "message": message}
+        
+    except Exception as exc:
+        return {"status": "error", "message": str(exc)}
+
+def disable_platform_payment_config(provider: str) -> Dict[str, Any]:
+    """停用平台支付配置（同时清除进程内配置缓存）"""
+    try:
+        with get_pool().writer(foreign_keys=False) as conn:
+            conn.execute('''
                 UPDATE platform_payment_configs 
-                SET public_key = ?, private_key = ?, updated_at = ?, status = 'active'
+                SET status = 'disabled', updated_at = ?
                 WHERE provider = ?
-            ''', (
-                encrypt_sensitive_data(public_key),
-                encrypt_sensitive_data(private_key),
-                time.time(),
-                provider
-            ))
-            message = "payment config updated"
-        else:
-            # 创建新配置
-            cursor.execute('''
-                INSERT INTO platform_payment_configs (provider, public_key, private_key, status)
-                VALUES (?, ?, ?, 'active')
-            ''', (
-                provider,
-                encrypt_sensitive_data(public_key),
-                encrypt_sensitive_data(private_key)
-            ))
-            message = "payment config created"
+            ''', (time.time(), provider))
         
-        conn.commit()
-        return {"status": "success", "message": message}
+        _invalidate_platform_payment_config(provider)
+        return {"status": "success", "message": f"config for {provider} cleared"}
         
     except Exception as exc:
-        conn.rollback()
         return {"status": "error", "message": str(exc)}
-    finally:
-        conn.close()
 
 def bind_payment_account(user_id: str, provider: str, account_no: str, 
                        account_name: Optional[str] = None) -> Dict[str, Any]:
@@ -183,24 +216,19 @@ def bind_payment_account(user_id: str, provider: str, account_no: str,
     if not platform_config:
         return {"status": "error", "message": f"platform not configured for {provider}"}
 
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
     try:
-        cursor.execute('''
-            INSERT INTO payment_accounts (user_id, provider, account_no, account_name, status)
-            VALUES (?, ?, ?, ?, 'pending')
-        ''', (user_id, provider, account_no, account_name))
-        
-        conn.commit()
-        return {"status": "success", "message": "payment account bound"}
-        
+        with get_pool().writer(foreign_keys=False) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO payment_accounts (user_id, provider, account_no, account_name, status)
+                VALUES (?, ?, ?, ?, 'pending')
+            ''', (user_id, provider, account_no, account_name))
+            
+            return {"status": "success", "message": "payment account bound"}
+            
     except Exception as exc:
-        conn.rollback()
         return {"status": "error", "message": str(exc)}
-    finally:
-        conn.close()
 
 def process_payment_transaction(provider: str, amount: float, order_id: str) -> Dict[str, Any]:
     """
@@ -238,8 +266,21 @@ def process_payment_transaction(provider: str, amount: float, order_id: str) ->
 
 # =============== Alipay 无回调前端轮询：页面支付与查询 ===============
 
+# 各接口共用的固定公共参数；app_id 仍逐次读取环境变量（.env 可能在本模块导入后才加载）
+_ALIPAY_COMMON_PARAMS = {
+    'format': 'JSON',
+    'charset': 'utf-8',
+    'sign_type': 'RSA2',
+    'version': '1.0',
+}
+
+# 解析后的私钥对象按 PEM 文本缓存，签名时不再逐次做 PEM/ASN.1 解析；密钥轮换后按新文本重新解析
+@lru_cache(maxsize=4)
+def _load_private_key(private_key_pem: str):
+    return load_pem_private_key(private_key_pem.encode('utf-8'), password=None)
+
 def _rsa2_sign(content: str, private_key_pem: str) -> str:
-    key = load_pem_private_key(private_key_pem.encode('utf-8'), password=None)
+    key = _load_private_key(private_key_pem)
     signature = key.sign(
         content.encode('utf-8'),
         padding.PKCS1v15(),
@@ -248,9 +289,8 @@ def _rsa2_sign(content: str, private_key_pem: str) -> str:
     return base64.b64encode(signature).decode('utf-8')
 
 def _ordered_query(params: Dict[str, Any]) -> str:
-    # 以 key 的字典序排序，值保持原文，不做 url 编码
-    items = [(k, params[k]) for k in sorted(params.keys()) if params[k] is not None and k != 'sign']
-    return "&".join([f"{k}={v}" for k, v in items])
+    # 以 key 的字典序排序，值保持原文，不做 url 编码；一次遍历排序后的键值对完成过滤与拼接
+    return "&".join(f"{k}={v}" for k, v in sorted(params.items()) if v is not None and k != 'sign')
 
 def create_alipay_page_pay(subject: str, total_amount: float, out_trade_no: str) -> Dict[str, Any]:
     """生成 PC 网页支付链接（FAST_INSTANT_TRADE_PAY），无回调场景。
@@ -269,22 +309,19 @@ def create_alipay_page_pay(subject: str, total_amount: float, out_trade_no: str)
         gateway = os.getenv('ALIPAY_GATEWAY') or 'https://openapi.alipay.com/gateway.do'
 
         # 通用参数
-        common = {
+        params = {
             'app_id': app_id,
             'method': 'alipay.trade.page.pay',
-            'format': 'JSON',
-            'charset': 'utf-8',
-            'sign_type': 'RSA2',
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'version': '1.0',
+            **_ALIPAY_COMMON_PARAMS,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
         }
         # 仅当配置不为空时才附带 return/notify
         ret = (os.getenv('PAY_RETURN_URL') or '').strip()
         noti = (os.getenv('PAY_NOTIFY_URL') or '').strip()
         if ret:
-            common['return_url'] = ret
+            params['return_url'] = ret
         if noti:
-            common['notify_url'] = noti
+            params['notify_url'] = noti
         biz_content = {
             'out_trade_no': out_trade_no,
             'product_code': 'FAST_INSTANT_TRADE_PAY',
@@ -292,7 +329,6 @@ def create_alipay_page_pay(subject: str, total_amount: float, out_trade_no: str)
             'subject': subject,
             # 可按需扩展: 'timeout_express': '15m'
         }
-        params = dict(common)
         params['biz_content'] = json.dumps(biz_content, ensure_ascii=False, separators=(',', ':'))
 
         # 签名
@@ -302,7 +338,7 @@ def create_alipay_page_pay(subject: str, total_amount: float, out_trade_no: str)
 
         # 生成最终 URL（参数需 url 编码）
         # 按支付宝规范，sign 也需要 url 编码
-        query = urlencode({k: params[k] for k in params}, quote_via=quote_plus)
+        query = urlencode(params, quote_via=quote_plus)
         pay_url = f"{gateway}?{query}"
         return {"status": "success", "pay_url": pay_url, "gateway": gateway}
     except Exception as e:
@@ -324,22 +360,19 @@ def create_alipay_wap_pay(subject: str, total_amount: float, out_trade_no: str)
             return {"status": "error", "message": "missing ALIPAY_APP_ID"}
         gateway = os.getenv('ALIPAY_GATEWAY') or 'https://openapi.alipay.com/gateway.do'
 
-        common = {
+        params = {
             'app_id': app_id,
             'method': 'alipay.trade.wap.pay',
-            'format': 'JSON',
-            'charset': 'utf-8',
-            'sign_type': 'RSA2',
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'version': '1.0',
+            **_ALIPAY_COMMON_PARAMS,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
         }
         ret = (os.getenv('PAY_RETURN_URL') or '').strip()
         noti = (os.getenv('PAY_NOTIFY_URL') or '').strip()
         quit_url = (os.getenv('PAY_QUIT_URL') or ret or '').strip()
         if ret:
-            common['return_url'] = ret
+            params['return_url'] = ret
         if noti:
-            common['notify_url'] = noti
+            params['notify_url'] = noti
         biz_content = {
             'out_trade_no': out_trade_no,
             'product_code': 'QUICK_WAP_WAY',
@@ -349,17 +382,41 @@ def create_alipay_wap_pay(subject: str, total_amount: float, out_trade_no: str)
         if quit_url:
             biz_content['quit_url'] = quit_url
 
-        params = dict(common)
         params['biz_content'] = json.dumps(biz_content, ensure_ascii=False, separators=(',', ':'))
         unsigned = _ordered_query(params)
         sign = _rsa2_sign(unsigned, private_key)
         params['sign'] = sign
-        query = urlencode({k: params[k] for k in params}, quote_via=quote_plus)
+        query = urlencode(params, quote_via=quote_plus)
         pay_url = f"{gateway}?{query}"
         return {"status": "success", "pay_url": pay_url, "gateway": gateway}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+# 支付宝网关的长连接会话：轮询查询复用 TCP/TLS 连接，不再每次握手；首次使用时创建
+_HTTP_SESSION = None
+_HTTP_SESSION_LOCK = threading.Lock()
+
+def _get_http_session():
+    global _HTTP_SESSION
+    if _HTTP_SESSION is not None:
+        return _HTTP_SESSION
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            session = requests.Session()
+            # alipay.trade.query 为只读查询，网关 5xx 时允许对 POST 重试
+            retry_strategy = Retry(
+                total=2,
+                backoff_factor=0.2,
+                status_forcelist=[502, 503, 504],
+                allowed_methods=["POST"]
+            )
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry_strategy))
+            _HTTP_SESSION = session
+    return _HTTP_SESSION
+
 def query_alipay_trade(out_trade_no: str) -> Dict[str, Any]:
     """服务端查询交易结果（alipay.trade.query）。返回 {status, paid, raw}。"""
     try:
@@ -372,27 +429,22 @@ def query_alipay_trade(out_trade_no: str) -> Dict[str, Any]:
             return {"status": "error", "message": "missing ALIPAY_APP_ID"}
         gateway = os.getenv('ALIPAY_GATEWAY') or 'https://openapi.alipay.com/gateway.do'
 
-        common = {
+        params = {
             'app_id': app_id,
             'method': 'alipay.trade.query',
-            'format': 'JSON',
-            'charset': 'utf-8',
-            'sign_type': 'RSA2',
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'version': '1.0',
+            **_ALIPAY_COMMON_PARAMS,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
         }
         biz_content = {
             'out_trade_no': out_trade_no,
         }
-        params = dict(common)
         params['biz_content'] = json.dumps(biz_content, ensure_ascii=False, separators=(',', ':'))
         unsigned = _ordered_query(params)
         sign = _rsa2_sign(unsigned, private_key)
         params['sign'] = sign
 
-        # 按官方要求使用 x-www-form-urlencoded POST
-        import requests
-        resp = requests.post(gateway, data=params, timeout=10)
+        # 按官方要求使用 x-www-form-urlencoded POST（连接超时 3s，读超时 10s）
+        resp = _get_http_session().post(gateway, data=params, timeout=(3, 10))
         if not resp.ok:
             return {"status": "error", "message": resp.text}
         data = resp.json()
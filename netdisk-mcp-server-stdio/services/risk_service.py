@@ -191,16 +191,26 @@ def get_user_operation_stats(user_id: str, action: str, hours: int = 24) -> Dict
         conn.close()
 
 
-def record_risk_event(user_id: str, event_type: str, reference_id: str = None, details: Dict[str, Any] = None, score: int = 0) -> Dict[str, Any]:
-    """写入风控事件。"""
+_SQL_INSERT_RISK_EVENT = '''
+    INSERT INTO risk_events (user_id, event_type, reference_id, details, score, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+def record_risk_event(user_id: str, event_type: str, reference_id: str = None, details: Dict[str, Any] = None, score: int = 0,
+                      cursor: Optional[sqlite3.Cursor] = None) -> Dict[str, Any]:
+    """写入风控事件。传入 cursor 时写入调用方的事务，由调用方提交。"""
+    row = (user_id, event_type, reference_id or '', str(details or {}), int(score), time.time())
+    if cursor is not None:
+        try:
+            cursor.execute(_SQL_INSERT_RISK_EVENT, row)
+            return {"status": "success", "id": cursor.lastrowid}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
     db_path = init_sync_db()
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     try:
-        cursor.execute('''
-            INSERT INTO risk_events (user_id, event_type, reference_id, details, score, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, event_type, reference_id or '', str(details or {}), int(score), time.time()))
+        cursor.execute(_SQL_INSERT_RISK_EVENT, row)
         conn.commit()
         return {"status": "success", "id": cursor.lastrowid}
     except Exception as e:
@@ -210,11 +220,16 @@ def record_risk_event(user_id: str, event_type: str, reference_id: str = None, d
         conn.close()
 
 
-def check_refund_frequency(user_id: str, window_seconds: int = 3600, max_requests: int = 3) -> Dict[str, Any]:
-    """示例规则：最近 window 内退款申请次数上限校验。"""
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def check_refund_frequency(user_id: str, window_seconds: int = 3600, max_requests: int = 3,
+                           cursor: Optional[sqlite3.Cursor] = None) -> Dict[str, Any]:
+    """示例规则：最近 window 内退款申请次数上限校验。
+    传入 cursor（须为连接池写连接，已开启写事务）时在调用方事务内计数并写入超限事件与预警，
+    与随后的退款申请写入串行，避免并发申请同时通过校验。
+    """
+    own = cursor is None
+    if own:
+        conn = sqlite3.connect(init_sync_db())
+        cursor = conn.cursor()
     try:
         since = time.time() - window_seconds
         cursor.execute('''
@@ -223,8 +238,9 @@ def check_refund_frequency(user_id: str, window_seconds: int = 3600, max_request
         cnt = cursor.fetchone()[0]
         if cnt >= max_requests:
             # 记录风控事件
-            record_risk_event(user_id, 'refund_freq_exceed', None, {"count": cnt, "window": window_seconds}, score=50)
-            # 管理员预警广播（不影响主流程）
+            record_risk_event(user_id, 'refund_freq_exceed', None, {"count": cnt, "window": window_seconds}, score=50,
+                              cursor=None if own else cursor)
+            # 管理员预警广播（不影响主流程；写连接同线程嵌套时并入调用方事务）
             try:
                 from .notify_service import dispatch_notifications
                 dispatch_notifications(
@@ -239,4 +255,5 @@ def check_refund_frequency(user_id: str, window_seconds: int = 3600, max_request
     except Exception as e:
         return {"status": "error", "message": str(e), "allowed": False}
     finally:
-        conn.close()
+        if own:
+            conn.close()
@@ -0,0 +1,391 @@
+-- 全部建表/建索引语句；由 services/db.py 在首次初始化时于同一事务内执行
+-- 创建同步任务表
+CREATE TABLE IF NOT EXISTS sync_tasks (
+    sync_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total_files INTEGER DEFAULT 0,
+    processed_files INTEGER DEFAULT 0,
+    failed_files INTEGER DEFAULT 0,
+    max_pages INTEGER DEFAULT 0,
+    current_page INTEGER DEFAULT 0,
+    start_time REAL,
+    last_update REAL,
+    client_id TEXT,
+    is_resume INTEGER DEFAULT 0
+);
+
+-- 创建文件记录表
+CREATE TABLE IF NOT EXISTS file_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sync_id TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    file_name TEXT,
+    file_size INTEGER,
+    file_md5 TEXT,
+    modify_time REAL,
+    create_time REAL,
+    category INTEGER,
+    isdir INTEGER,
+    fs_id INTEGER,
+    status TEXT DEFAULT 'pending',
+    error_msg TEXT,
+    FOREIGN KEY (sync_id) REFERENCES sync_tasks (sync_id)
+);
+
+-- 为 file_path 增加索引，优化基于路径前缀的统计/查询
+CREATE INDEX IF NOT EXISTS idx_file_records_path ON file_records(file_path);
+
+-- 创建用户表（时间戳为整数秒；WITHOUT ROWID 仅对新库生效，旧库沿用原表）
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    display_name TEXT,
+    avatar_url TEXT,
+    role TEXT DEFAULT 'basic',
+    registered_at INTEGER,
+    last_login_at INTEGER
+) WITHOUT ROWID;
+
+-- 创建支付绑定表
+CREATE TABLE IF NOT EXISTS payment_accounts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    account_no TEXT NOT NULL,
+    account_name TEXT,
+    status TEXT DEFAULT 'pending',
+    verified_at REAL,
+    deleted_at REAL,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    updated_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- 创建会话表（时间戳为整数秒；WITHOUT ROWID 仅对新库生效，旧库沿用原表）
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    access_token TEXT,
+    refresh_token TEXT,
+    created_at INTEGER,
+    expires_at INTEGER,
+    user_agent TEXT,
+    ip_address TEXT,
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+) WITHOUT ROWID;
+
+-- 创建支付账户审计日志表
+CREATE TABLE IF NOT EXISTS payment_account_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    status TEXT NOT NULL,
+    remark TEXT,
+    operator_id TEXT,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (account_id) REFERENCES payment_accounts(id)
+);
+
+-- 创建平台支付配置表
+CREATE TABLE IF NOT EXISTS platform_payment_configs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    provider TEXT NOT NULL UNIQUE,
+    public_key TEXT NOT NULL,
+    private_key TEXT NOT NULL,
+    status TEXT DEFAULT 'active',
+    created_at REAL DEFAULT (strftime('%s','now')),
+    updated_at REAL DEFAULT (strftime('%s','now'))
+);
+
+-- 创建交易相关表
+-- 商品上架相关
+CREATE TABLE IF NOT EXISTS listings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    seller_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT,
+    listing_type TEXT NOT NULL,
+    price_cents INTEGER NOT NULL,
+    currency TEXT DEFAULT 'CNY',
+    min_price_cents INTEGER,
+    max_price_cents INTEGER,
+    platform_split REAL DEFAULT 0.4,
+    seller_split REAL DEFAULT 0.6,
+    status TEXT DEFAULT 'draft',
+    review_status TEXT DEFAULT 'pending',
+    review_remark TEXT,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    updated_at REAL DEFAULT (strftime('%s','now')),
+    published_at REAL,
+    FOREIGN KEY (seller_id) REFERENCES users(user_id)
+);
+
+CREATE TABLE IF NOT EXISTS listing_files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    listing_id INTEGER NOT NULL,
+    file_path TEXT NOT NULL,
+    file_name TEXT,
+    file_size INTEGER,
+    file_md5 TEXT,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (listing_id) REFERENCES listings(id)
+);
+
+CREATE TABLE IF NOT EXISTS listing_reviews (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    listing_id INTEGER NOT NULL,
+    reviewer_id TEXT,
+    status TEXT NOT NULL,
+    remark TEXT,
+    reviewed_at REAL,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (listing_id) REFERENCES listings(id)
+);
+
+-- 订单、支付、交付
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_no TEXT NOT NULL UNIQUE,
+    buyer_id TEXT NOT NULL,
+    seller_id TEXT NOT NULL,
+    total_amount_cents INTEGER NOT NULL,
+    platform_fee_cents INTEGER NOT NULL,
+    seller_amount_cents INTEGER NOT NULL,
+    currency TEXT DEFAULT 'CNY',
+    status TEXT DEFAULT 'pending',
+    payment_status TEXT DEFAULT 'pending',
+    created_at REAL DEFAULT (strftime('%s','now')),
+    updated_at REAL DEFAULT (strftime('%s','now')),
+    paid_at REAL,
+    delivered_at REAL,
+    completed_at REAL,
+    remark TEXT,
+    -- 退款相关（迁移时按需补齐）
+    refund_status TEXT,                -- pending/approved/rejected/processed
+    refund_requested_at REAL,
+    refund_processed_at REAL,
+    refund_reason TEXT,
+    FOREIGN KEY (buyer_id) REFERENCES users(user_id),
+    FOREIGN KEY (seller_id) REFERENCES users(user_id)
+);
+
+CREATE TABLE IF NOT EXISTS order_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    listing_id INTEGER NOT NULL,
+    price_cents INTEGER NOT NULL,
+    quantity INTEGER DEFAULT 1,
+    deliver_path TEXT,
+    delivered_at REAL,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (order_id) REFERENCES orders(id),
+    FOREIGN KEY (listing_id) REFERENCES listings(id)
+);
+
+CREATE TABLE IF NOT EXISTS order_payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    provider TEXT NOT NULL,
+    transaction_id TEXT,
+    amount_cents INTEGER NOT NULL,
+    status TEXT DEFAULT 'pending',
+    payload TEXT,
+    paid_at REAL,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (order_id) REFERENCES orders(id)
+);
+
+-- 退款申请表
+CREATE TABLE IF NOT EXISTS refund_requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    buyer_id TEXT NOT NULL,
+    seller_id TEXT NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    reason TEXT,
+    status TEXT DEFAULT 'pending',
+    created_at REAL DEFAULT (strftime('%s','now')),
+    processed_at REAL,
+    reviewer_id TEXT,
+    remark TEXT,
+    FOREIGN KEY (order_id) REFERENCES orders(id),
+    FOREIGN KEY (buyer_id) REFERENCES users(user_id),
+    FOREIGN KEY (seller_id) REFERENCES users(user_id)
+);
+
+-- 风控事件表
+CREATE TABLE IF NOT EXISTS risk_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    reference_id TEXT,
+    details TEXT,
+    score INTEGER DEFAULT 0,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_purchases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    listing_id INTEGER NOT NULL,
+    buyer_id TEXT NOT NULL,
+    file_path TEXT,
+    download_count INTEGER DEFAULT 0,
+    last_accessed_at REAL,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (order_id) REFERENCES orders(id),
+    FOREIGN KEY (listing_id) REFERENCES listings(id),
+    FOREIGN KEY (buyer_id) REFERENCES users(user_id)
+);
+
+-- 钱包 / 提现 / 审计
+CREATE TABLE IF NOT EXISTS user_wallets (
+    user_id TEXT PRIMARY KEY,
+    balance_cents INTEGER DEFAULT 0,
+    pending_settlement_cents INTEGER DEFAULT 0,
+    updated_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+CREATE TABLE IF NOT EXISTS payout_requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    status TEXT DEFAULT 'pending',
+    method TEXT,
+    account_info TEXT,
+    remark TEXT,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    processed_at REAL,
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- 钱包流水表
+CREATE TABLE IF NOT EXISTS wallet_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    change_cents INTEGER NOT NULL,
+    balance_after INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    reference_id TEXT,
+    remark TEXT,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- 提现审核日志表
+CREATE TABLE IF NOT EXISTS payout_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payout_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    reviewer_id TEXT,
+    remark TEXT,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (payout_id) REFERENCES payout_requests(id)
+);
+
+-- 频控日志表
+CREATE TABLE IF NOT EXISTS rate_limit_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- 订单操作日志表
+CREATE TABLE IF NOT EXISTS order_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    details TEXT,
+    user_id TEXT,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (order_id) REFERENCES orders(id),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- 支付回调日志表
+CREATE TABLE IF NOT EXISTS payment_callback_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    provider TEXT NOT NULL,
+    transaction_id TEXT,
+    status TEXT NOT NULL,
+    payload TEXT,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (order_id) REFERENCES orders(id)
+);
+
+-- 通知表（基础）
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT,
+    type TEXT DEFAULT 'info',
+    status TEXT DEFAULT 'unread',
+    sender_role TEXT,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    read_at REAL,
+    -- 迭代1新增字段（兼容新增）
+    target_scope TEXT DEFAULT 'user', -- user/role/all
+    target_role TEXT,
+    channel TEXT DEFAULT 'inbox',
+    metadata TEXT,
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- 事件表：用于点击/阅读追踪
+CREATE TABLE IF NOT EXISTS notification_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    notification_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    event TEXT NOT NULL, -- read/view/click
+    read_at REAL,
+    viewed_at REAL,
+    extra TEXT,
+    created_at REAL DEFAULT (strftime('%s','now')),
+    FOREIGN KEY (notification_id) REFERENCES notifications(id),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- 索引（目标范围+时间）
+CREATE INDEX IF NOT EXISTS idx_notifications_target_scope_created_at ON notifications(target_scope, created_at DESC);
+-- 用户通知列表/未读计数（按用户+状态范围扫描，结果已按时间倒序）
+CREATE INDEX IF NOT EXISTS idx_notif_user_status_created ON notifications(user_id, status, created_at DESC);
+-- 管理端全量通知按时间倒序
+CREATE INDEX IF NOT EXISTS idx_notif_created ON notifications(created_at DESC);
+-- 按 metadata.kind 筛选通知（表达式索引，查询须使用相同的 json_extract 表达式）
+CREATE INDEX IF NOT EXISTS idx_notif_meta_kind ON notifications(json_extract(metadata, '$.kind'));
+
+-- 订单交付按商品取文件
+CREATE INDEX IF NOT EXISTS idx_listing_files_listing ON listing_files(listing_id);
+
+-- 会话索引（按用户查会话、清理过期会话）
+CREATE INDEX IF NOT EXISTS idx_sessions_user_expires ON sessions(user_id, expires_at);
+
+-- 索引补充
+CREATE INDEX IF NOT EXISTS idx_orders_refund_status ON orders(refund_status);
+-- 财务对账相关索引
+CREATE INDEX IF NOT EXISTS idx_orders_status_completed ON orders(status, completed_at DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_refund_combo ON orders(status, refund_status);
+CREATE INDEX IF NOT EXISTS idx_refund_requests_status_created ON refund_requests(status, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_refund_requests_status_processed ON refund_requests(status, processed_at DESC);
+CREATE INDEX IF NOT EXISTS idx_risk_events_user_created ON risk_events(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_payout_requests_status_processed ON payout_requests(status, processed_at DESC);
+CREATE INDEX IF NOT EXISTS idx_wallet_logs_created ON wallet_logs(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_wallet_logs_type ON wallet_logs(type);
+-- 订单模块热点查询：重复购买校验、买/卖家订单列表（按时间倒序直接走索引，免排序）
+CREATE INDEX IF NOT EXISTS idx_user_purchases_buyer_listing ON user_purchases(buyer_id, listing_id);
+CREATE INDEX IF NOT EXISTS idx_orders_buyer_created ON orders(buyer_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_seller_created ON orders(seller_id, created_at DESC);
+-- 订单详情按订单取订单项、支付记录（支付记录按时间倒序直接走索引，免排序）
+CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id);
+CREATE INDEX IF NOT EXISTS idx_order_payments_order_created ON order_payments(order_id, created_at DESC);
+-- 幂等与唯一性约束（ux_order_payments_txnid、ux_wallet_logs_dedupe）不在本脚本中：
+-- 旧库可能已有重复数据，建唯一索引会失败，由 db._ensure_unique_indexes 逐条容错创建
+
+-- 建索引后刷新统计信息，便于查询规划器选用新索引
+ANALYZE;
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+订单副作用线程池
+支付回调提交后的通知与日志在后台线程执行，回调不再等待这些 I/O；
+各订单服务模块共用同一个线程池
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+_SIDE_EFFECTS = ThreadPoolExecutor(max_workers=4, thread_name_prefix="order-side-effects")
+
+
+def submit_side_effects(tasks: List[Tuple[Callable[..., Any], tuple, Dict[str, Any]]]) -> None:
+    """
+    投递提交后的副作用任务（fire-and-forget），单个任务失败不影响回调结果
+    """
+    for fn, args, kwargs in tasks:
+        _SIDE_EFFECTS.submit(fn, *args, **kwargs)
@@ -40,16 +40,33 @@ def check_pending_payout_requests(user_id: str) -> Dict[str, Any]:
     finally:
         conn.close()
 
-def award_seller(order_id: int, seller_id: str, seller_amount_cents: int) -> Dict[str, Any]:
+def _finish_wallet_tx(conn: sqlite3.Connection, own: bool) -> None:
+    """
+    结束钱包写操作：自有连接直接关闭（未提交的部分随之丢弃）；
+    调用方连接上回滚并释放尚未 RELEASE 的 SAVEPOINT，不影响调用方事务的其余部分
+    """
+    if own:
+        conn.close()
+        return
+    try:
+        conn.execute('ROLLBACK TO wallet_tx')
+        conn.execute('RELEASE wallet_tx')
+    except sqlite3.OperationalError:
+        pass  # 已 RELEASE（正常完成）
+
+def award_seller(order_id: int, seller_id: str, seller_amount_cents: int,
+                 conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
     """
     支付成功后奖励卖家，增加待结算金额
+    conn：调用方已开启写事务的连接；传入时以 SAVEPOINT 在其事务内执行，随调用方一并提交
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
+    own = conn is None
+    if own:
+        conn = sqlite3.connect(init_sync_db())
     cursor = conn.cursor()
     
     try:
-        conn.execute('BEGIN TRANSACTION')
+        conn.execute('BEGIN IMMEDIATE' if own else 'SAVEPOINT wallet_tx')
         
         # 检查用户钱包是否存在，不存在则创建
         cursor.execute('''
@@ -80,7 +97,10 @@ def award_seller(order_id: int, seller_id: str, seller_amount_cents: int) -> Dic
             ''', (seller_id, seller_amount_cents, pending_settlement_cents, str(order_id), 
                   f"订单 {order_id} 支付成功，待结算金额 +{seller_amount_cents/100:.2f}元"))
         
-        conn.commit()
+        if own:
+            conn.commit()
+        else:
+            conn.execute('RELEASE wallet_tx')
         
         return {
             "status": "success",
@@ -88,23 +108,27 @@ def award_seller(order_id: int, seller_id: str, seller_amount_cents: int) -> Dic
         }
         
     except Exception as exc:
-        conn.rollback()
+        if own:
+            conn.rollback()
         return {"status": "error", "message": str(exc)}
     finally:
-        conn.close()
+        _finish_wallet_tx(conn, own)
 
-def settle_seller(order_id: int, seller_id: str) -> Dict[str, Any]:
+def settle_seller(order_id: int, seller_id: str,
+                  conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
     """
     交付完成时，按订单维度将该订单的收益从待结算转入余额。
     - 幂等：若 wallet_logs 已存在 (user_id, type='settlement', reference_id=order_id) 则直接返回成功。
     - 仅结算本订单金额：不会清空卖家全部待结算。
+    - conn：同 award_seller，传入调用方写事务中的连接时以 SAVEPOINT 执行。
     """
-    db_path = init_sync_db()
-    conn = sqlite3.connect(db_path)
+    own = conn is None
+    if own:
+        conn = sqlite3.connect(init_sync_db())
     cursor = conn.cursor()
     
     try:
-        conn.execute('BEGIN TRANSACTION')
+        conn.execute('BEGIN IMMEDIATE' if own else 'SAVEPOINT wallet_tx')
         
         # 获取订单的卖家与应结算金额
         cursor.execute('''
@@ -166,7 +190,10 @@ def settle_seller(order_id: int, seller_id: str) -> Dict[str, Any]:
         ''', (seller_id, settle_amount, new_balance, str(order_id),
               f"订单 {order_id} 结算 {settle_amount/100:.2f}元"))
         
-        conn.commit()
+        if own:
+            conn.commit()
+        else:
+            conn.execute('RELEASE wallet_tx')
         return {
             "status": "success",
             "message": f"卖家 {seller_id} 订单结算完成，余额增加 {settle_amount/100:.2f}元",
@@ -175,10 +202,11 @@ def settle_seller(order_id: int, seller_id: str) -> Dict[str, Any]:
             "new_pending": new_pending
         }
     except Exception as exc:
-        conn.rollback()
+        if own:
+            conn.rollback()
         return {"status": "error", "message": str(exc)}
     finally:
-        conn.close()
+        _finish_wallet_tx(conn, own)
 
 def create_payout_request(user_id: str, amount_cents: int, method: str, 
                          account_info: str, remark: str = "") -> Dict[str, Any]:
@@ -214,7 +242,7 @@ def create_payout_request(user_id: str, amount_cents: int, method: str,
     cursor = conn.cursor()
     
     try:
-        conn.execute('BEGIN TRANSACTION')
+        conn.execute('BEGIN IMMEDIATE')
 
         # 检查用户钱包余额
         cursor.execute('''
@@ -291,7 +319,7 @@ def review_payout_request(request_id: int, reviewer_id: str, status: str,
     cursor = conn.cursor()
     
     try:
-        conn.execute('BEGIN TRANSACTION')
+        conn.execute('BEGIN IMMEDIATE')
         
         # 获取提现申请信息
         cursor.execute('''
@@ -496,7 +524,7 @@ def refund_out(user_id: str, amount_cents: int, reference_id: str, remark: str =
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     try:
-        conn.execute('BEGIN TRANSACTION')
+        conn.execute('BEGIN IMMEDIATE')
         cursor.execute('SELECT balance_cents, pending_settlement_cents FROM user_wallets WHERE user_id = ?', (user_id,))
         row = cursor.fetchone()
         if not row:
@@ -528,7 +556,7 @@ def refund_in(user_id: str, amount_cents: int, reference_id: str, remark: str =
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     try:
-        conn.execute('BEGIN TRANSACTION')
+        conn.execute('BEGIN IMMEDIATE')
         cursor.execute('INSERT OR IGNORE INTO user_wallets (user_id, balance_cents, pending_settlement_cents) VALUES (?, 0, 0)', (user_id,))
         cursor.execute('SELECT balance_cents FROM user_wallets WHERE user_id = ?', (user_id,))
         row = cursor.fetchone(); balance = row[0] if row else 0
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单写线程
+写请求投递到队列，由一个后台线程持有写连接串行执行；
+同一时间窗口内的多个写任务合并到一个 BEGIN IMMEDIATE ... COMMIT 事务，
+登录高峰时提交次数按批量大小成倍减少
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+from .db import init_sync_db, apply_pragmas, CACHED_STATEMENTS
+
+# 每批最多合并的写任务数与最长等待时间（秒）
+MAX_BATCH_SIZE = 64
+BATCH_WAIT_SECONDS = 0.01
+
+# 调用方等待写结果的上限（秒）：略大于 busy_timeout，超时按失败处理而不是无限阻塞
+RESULT_TIMEOUT = 10
+
+
+class WriteResult(NamedTuple):
+    lastrowid: Optional[int]
+    rowcount: int
+    rows: List[Tuple[Any, ...]]  # RETURNING 子句返回的行
+
+
+_QUEUE: "queue.Queue[Tuple[str, Sequence[Any], Future]]" = queue.Queue()
+_THREAD: Optional[threading.Thread] = None
+_THREAD_LOCK = threading.Lock()
+
+
+def submit(sql: str, params: Sequence[Any] = ()) -> "Future[WriteResult]":
+    """
+    投递一条写语句，返回 Future；结果为 WriteResult
+    单条语句失败只回滚该语句（SAVEPOINT），不影响同批其他任务
+    """
+    fut: "Future[WriteResult]" = Future()
+    # 先入队再确认写线程存活：写线程异常退出时先清空线程句柄再清空队列，
+    # 入队早于清空的任务会被置为失败，晚于的由新启动的写线程处理，不会悬挂
+    _QUEUE.put((sql, params, fut))
+    _ensure_started()
+    return fut
+
+
+def _ensure_started() -> None:
+    global _THREAD
+    if _THREAD is not None:
+        return
+    with _THREAD_LOCK:
+        if _THREAD is None:
+            _THREAD = threading.Thread(target=_run, name="sqlite-writer", daemon=True)
+            _THREAD.start()
+
+
+def _run() -> None:
+    global _THREAD
+    conn: Optional[sqlite3.Connection] = None
+    batch: List[Tuple[str, Sequence[Any], Future]] = []
+    try:
+        conn = sqlite3.connect(init_sync_db(), cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+        apply_pragmas(conn)
+        while True:
+            batch = [_QUEUE.get()]
+            deadline = time.monotonic() + BATCH_WAIT_SECONDS
+            while len(batch) < MAX_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(_QUEUE.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            _execute_batch(conn, batch)
+            batch = []
+    except BaseException as exc:
+        # 写线程异常退出（建库/连接失败等）：清空线程句柄以便下次 submit 重建，
+        # 当前批与队列中剩余的任务全部置为失败，调用方拿到异常而不是永久等待
+        with _THREAD_LOCK:
+            _THREAD = None
+        _fail_pending(batch, exc)
+        if conn is not None:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+def _fail_pending(batch: List[Tuple[str, Sequence[Any], Future]], exc: BaseException) -> None:
+    pending = [fut for _, _, fut in batch]
+    while True:
+        try:
+            pending.append(_QUEUE.get_nowait()[2])
+        except queue.Empty:
+            break
+    for fut in pending:
+        if fut.done():
+            continue
+        if fut.running() or fut.set_running_or_notify_cancel():
+            fut.set_exception(exc)
+
+
+def _execute_batch(conn: sqlite3.Connection, batch: List[Tuple[str, Sequence[Any], Future]]) -> None:
+    done: List[Tuple[Future, WriteResult]] = []
+    running = [fut for _, _, fut in batch if fut.set_running_or_notify_cancel()]
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        for sql, params, fut in batch:
+            if fut not in running:
+                continue
+            conn.execute('SAVEPOINT write_task')
+            try:
+                cur = conn.execute(sql, params)
+                rows = cur.fetchall()
+                done.append((fut, WriteResult(cur.lastrowid, cur.rowcount, rows)))
+                conn.execute('RELEASE write_task')
+            except Exception as exc:
+                conn.execute('ROLLBACK TO write_task')
+                conn.execute('RELEASE write_task')
+                fut.set_exception(exc)
+        conn.commit()
+    except Exception as exc:
+        # 事务级失败（加锁/提交失败）：整批回滚，所有未完成任务均报错
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+        for fut in running:
+            if not fut.done():
+                fut.set_exception(exc)
+        return
+    for fut, result in done:
+        fut.set_result(result)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话验证缓存测试：命中缓存、缓存内仍校验会话过期、无效 session_id 负缓存、角色变更后失效
+"""
+
+import queue
+import sqlite3
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+
+from services import auth_service, db, db_pool, writer
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    # 独立的临时库、连接池、写线程与缓存
+    monkeypatch.setattr(db, "_DB_PATH", str(tmp_path / "auth.db"))
+    monkeypatch.setattr(db, "_SCHEMA_READY", False)
+    monkeypatch.setattr(db_pool, "_POOL", None)
+    monkeypatch.setattr(writer, "_QUEUE", queue.Queue())
+    monkeypatch.setattr(writer, "_THREAD", None)
+    monkeypatch.setattr(auth_service, "_SESSION_CACHE", OrderedDict())
+    monkeypatch.setattr(auth_service, "_BAD_SIDS", OrderedDict())
+
+    clock = [1_700_000_000]
+    monkeypatch.setattr(auth_service, "_now_s", lambda: clock[0])
+
+    reads = []
+    real_get_db_connection = auth_service.get_db_connection
+
+    def counting_get_db_connection():
+        reads.append(1)
+        return real_get_db_connection()
+
+    monkeypatch.setattr(auth_service, "get_db_connection", counting_get_db_connection)
+    return SimpleNamespace(clock=clock, reads=reads)
+
+
+def _login(user_id="u1", ttl_seconds=3600):
+    assert auth_service.upsert_user(user_id, "name")["status"] == "success"
+    session = auth_service.create_session(user_id, ttl_seconds=ttl_seconds)
+    assert session["status"] == "success"
+    return session["session_id"]
+
+
+def _execute(sql, params=()):
+    conn = sqlite3.connect(db.init_sync_db())
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def test_second_verify_is_served_from_cache(env):
+    sid = _login()
+
+    assert auth_service.verify_session(sid)["user_id"] == "u1"
+    assert len(env.reads) == 1
+    assert auth_service.verify_session(sid)["user_id"] == "u1"
+    assert len(env.reads) == 1
+
+
+def test_cached_session_still_expires(env):
+    sid = _login(ttl_seconds=10)
+    assert auth_service.verify_session(sid) is not None
+
+    # 缓存 TTL（30s）未到，但会话本身已过期
+    env.clock[0] += 11
+    assert auth_service.verify_session(sid) is None
+    assert sid not in auth_service._SESSION_CACHE
+
+
+def test_unknown_session_id_is_cached_as_bad(env):
+    _login()
+    assert auth_service.verify_session("missing") is None
+    assert len(env.reads) == 1
+    assert auth_service.verify_session("missing") is None
+    assert len(env.reads) == 1
+
+    # 负缓存过期后重新查库
+    env.clock[0] += auth_service.BAD_SESSION_TTL + 1
+    assert auth_service.verify_session("missing") is None
+    assert len(env.reads) == 2
+
+
+def test_invalidate_user_sessions_picks_up_role_change(env):
+    sid = _login()
+    other = _login("u2")
+    assert auth_service.verify_session(sid)["role"] == "basic"
+    assert auth_service.verify_session(other)["role"] == "basic"
+
+    _execute("UPDATE users SET role = 'admin' WHERE user_id = ?", ("u1",))
+    assert auth_service.verify_session(sid)["role"] == "basic"
+
+    auth_service.invalidate_user_sessions("u1")
+    assert auth_service.verify_session(sid)["role"] == "admin"
+    assert other in auth_service._SESSION_CACHE
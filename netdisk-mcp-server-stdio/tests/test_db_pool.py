@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+连接池测试：嵌套写事务的 SAVEPOINT 隔离、外层回滚、未提交归还回滚、BEGIN IMMEDIATE 忙重试
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from services import db_pool
+from services.db_pool import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / "pool.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+    return ConnectionPool(path)
+
+
+def _values(pool):
+    with pool.reader() as conn:
+        return [row[0] for row in conn.execute("SELECT v FROM t ORDER BY id")]
+
+
+def test_nested_writer_rolls_back_only_inner(pool):
+    with pool.writer() as conn:
+        conn.execute("INSERT INTO t (v) VALUES ('outer')")
+        with pytest.raises(RuntimeError):
+            with pool.writer() as inner:
+                assert inner is conn
+                inner.execute("INSERT INTO t (v) VALUES ('inner')")
+                raise RuntimeError("inner failed")
+        with pool.writer() as inner:
+            inner.execute("INSERT INTO t (v) VALUES ('inner ok')")
+
+    assert _values(pool) == ["outer", "inner ok"]
+
+
+def test_outer_exception_rolls_back_everything(pool):
+    with pytest.raises(RuntimeError):
+        with pool.writer() as conn:
+            conn.execute("INSERT INTO t (v) VALUES ('outer')")
+            with pool.writer() as inner:
+                inner.execute("INSERT INTO t (v) VALUES ('inner')")
+            raise RuntimeError("outer failed")
+
+    assert _values(pool) == []
+    # 写连接已回到可用状态
+    with pool.writer() as conn:
+        conn.execute("INSERT INTO t (v) VALUES ('after')")
+    assert _values(pool) == ["after"]
+
+
+def test_close_without_commit_rolls_back(pool):
+    conn = pool.acquire()
+    conn.execute("INSERT INTO t (v) VALUES ('uncommitted')")
+    conn.close()
+
+    assert _values(pool) == []
+
+    with pool.acquire() as conn:
+        conn.execute("INSERT INTO t (v) VALUES ('committed')")
+    assert _values(pool) == ["committed"]
+
+
+def test_busy_retries_rerun_begin_immediate(pool, monkeypatch):
+    monkeypatch.setattr(db_pool, "BUSY_RETRY_DELAY", 0.05)
+    pool._writer_conn = pool._connect()
+    pool._writer_conn.execute("PRAGMA busy_timeout=0")
+
+    blocker = sqlite3.connect(pool.db_path, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            with pool.writer():
+                pass
+
+        timer = threading.Timer(0.2, blocker.rollback)
+        timer.start()
+        with pool.writer(busy_retries=20) as conn:
+            conn.execute("INSERT INTO t (v) VALUES ('retried')")
+        timer.join()
+    finally:
+        blocker.close()
+
+    assert _values(pool) == ["retried"]
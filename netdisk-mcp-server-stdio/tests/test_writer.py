@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单写线程测试：批量合并、单条语句 SAVEPOINT 隔离、写线程异常退出
+"""
+
+import queue
+import sqlite3
+from concurrent.futures import Future
+
+import pytest
+
+from services import writer
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "writer.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def fresh_writer(monkeypatch):
+    # 每个用例使用独立队列与线程句柄，避免与其他用例的写线程互相消费
+    monkeypatch.setattr(writer, "_QUEUE", queue.Queue())
+    monkeypatch.setattr(writer, "_THREAD", None)
+    return writer
+
+
+def _task(sql, params=()):
+    return (sql, params, Future())
+
+
+def test_batch_commits_in_one_transaction(db_path):
+    conn = sqlite3.connect(db_path)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    batch = [_task("INSERT INTO t (v) VALUES (?)", (str(i),)) for i in range(5)]
+
+    writer._execute_batch(conn, batch)
+
+    assert statements.count("BEGIN IMMEDIATE") == 1
+    assert statements.count("COMMIT") == 1
+    assert [fut.result(timeout=1).lastrowid for _, _, fut in batch] == [1, 2, 3, 4, 5]
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 5
+
+
+def test_failed_statement_only_rolls_back_itself(db_path):
+    conn = sqlite3.connect(db_path)
+    ok1 = _task("INSERT INTO t (id, v) VALUES (1, 'a')")
+    dup = _task("INSERT INTO t (id, v) VALUES (1, 'b')")
+    ok2 = _task("INSERT INTO t (id, v) VALUES (2, 'c') RETURNING id, v")
+
+    writer._execute_batch(conn, [ok1, dup, ok2])
+
+    assert ok1[2].result(timeout=1).rowcount == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        dup[2].result(timeout=1)
+    assert ok2[2].result(timeout=1).rows == [(2, "c")]
+    assert conn.execute("SELECT id, v FROM t ORDER BY id").fetchall() == [(1, "a"), (2, "c")]
+
+
+def test_submit_through_writer_thread(fresh_writer, monkeypatch, db_path):
+    monkeypatch.setattr(fresh_writer, "init_sync_db", lambda: db_path)
+
+    futures = [fresh_writer.submit("INSERT INTO t (v) VALUES (?)", (str(i),)) for i in range(10)]
+
+    results = [fut.result(timeout=fresh_writer.RESULT_TIMEOUT) for fut in futures]
+    assert sorted(r.lastrowid for r in results) == list(range(1, 11))
+
+
+def test_writer_failure_fails_pending_and_restarts(fresh_writer, monkeypatch, db_path):
+    def broken():
+        raise RuntimeError("db unavailable")
+
+    monkeypatch.setattr(fresh_writer, "init_sync_db", broken)
+    fut = fresh_writer.submit("INSERT INTO t (v) VALUES ('x')")
+    with pytest.raises(RuntimeError, match="db unavailable"):
+        fut.result(timeout=fresh_writer.RESULT_TIMEOUT)
+    assert fresh_writer._THREAD is None
+    assert fresh_writer._QUEUE.empty()
+
+    # 写线程退出后再次投递会重新拉起写线程
+    monkeypatch.setattr(fresh_writer, "init_sync_db", lambda: db_path)
+    result = fresh_writer.submit("INSERT INTO t (v) VALUES ('y')").result(timeout=fresh_writer.RESULT_TIMEOUT)
+    assert result.rowcount == 1